@@ -1,11 +1,7 @@
-from flask import Flask
-
-
-app = Flask(__name__)
-
-app.config['JSON_AS_ASCII'] = False
-
-
-import pythoncz.pages.index.views
-import pythoncz.pages.articles.views
-import pythoncz.pages.events.views
+def __getattr__(name):
+    # The web application gets constructed (and the views registered) only
+    # when it's needed, so commands which don't need it start fast
+    if name == 'app':
+        from pythoncz.web import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,22 @@
 import os
 import json
+import time
 import shlex
 import urllib
+import hashlib
 import warnings
+import threading
+import importlib
 import subprocess
 from pathlib import Path
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import click
-import flask_frozen
 
-from pythoncz import app, log
+from pythoncz import log
+from pythoncz.cli.report import (measure, rusage_to_stats, write_report,
+                                 format_summary)
 
 
 logger = log.get(__name__)
@@ -19,13 +26,20 @@ PROJECT_PATH = Path(__file__).parent.parent.parent
 NOW_CONFIG_DEFAULTS = PROJECT_PATH / 'now-defaults.json'
 
 PAGES_PATH = PROJECT_PATH / 'pythoncz' / 'pages'
-PAGE_BUILDERS_NAMES = [
-    item.name for item in PAGES_PATH.iterdir()
-    if item.is_dir() and (PAGES_PATH / item / '__main__.py').is_file()
-]
 
 WEB_BUILD_PATH = PROJECT_PATH / 'build'
 WEB_BASE_URL = 'https://python.cz'
+WEB_SOURCES_PATH = PROJECT_PATH / 'pythoncz'
+
+# Files in the build directory which aren't part of the website
+WEB_BUILD_EXTRA_NAMES = ('now.json',)
+
+CACHE_PATH = PROJECT_PATH / '.cache'
+WEB_BUILD_MANIFEST_PATH = CACHE_PATH / 'web_build_manifest.json'
+DEPLOY_MANIFEST_PATH = CACHE_PATH / 'deploy_manifest.json'
+OPTIMIZE_MANIFEST_PATH = CACHE_PATH / 'optimize_manifest.json'
+IMAGES_CACHE_PATH = CACHE_PATH / 'images'
+BUILD_REPORT_PATH = CACHE_PATH / 'build_report.json'
 
 
 @click.group()
@@ -33,51 +47,312 @@ def cli():
     pass
 
 
+# Commands import what they need only when they run, so the CLI starts fast
+# and e.g. 'deploy' doesn't need to construct the web application
+
+
 @cli.command()
 @click.option('--port', type=int, default=8000, help='Port to listen at')
-def serve(port):
+@click.option('--watch', is_flag=True,
+              help='Rebuild data of pages when their config or code changes')
+def serve(port, watch=False):
+    from pythoncz.web import app
+    from pythoncz.cli.watch import watch_pages
+
+    # The app runs in a process which Flask's reloader restarts on changes,
+    # the watcher stays in the reloader's process, so it isn't interrupted.
+    # Data files get replaced atomically and load_data() picks them up.
+    if watch and os.getenv('WERKZEUG_RUN_MAIN') != 'true':
+        names = get_page_builders_names(PAGES_PATH)
+        log(f'Watching {", ".join(names)} for changes')
+        threading.Thread(target=watch_pages,
+                         args=(PAGES_PATH, names, rebuild_page),
+                         daemon=True).start()
     app.run(host='0.0.0.0', port=port, debug=True)
 
 
+def rebuild_page(name):
+    log(f'Rebuilding data for {name}')
+    completed_process, stats = run_page_builder(name)
+    click.echo(prefix_lines(completed_process.stdout, f'[{name}] '),
+               nl=False)
+    if completed_process.returncode:
+        click.secho(f'Building data for {name} failed', fg='red')
+    else:
+        log(f"Data for {name} rebuilt in {stats['wall_time']:.1f}s")
+
+
 @cli.command()
 @click.argument('target', required=False)
+@click.option('--jobs', '-j', type=click.IntRange(min=1),
+              help='How many page builders to run at once [default: all]')
+@click.option('--web-jobs', type=click.IntRange(min=1), default=1,
+              help='How many processes should render the web pages')
+@click.option('--full', is_flag=True,
+              help="Render all web pages, even if their inputs didn't change")
+@click.option('--webp', is_flag=True,
+              help='Write WebP versions of PNG images (requires Pillow)')
 @click.pass_context
-def build(ctx, target=None):
-    if target in PAGE_BUILDERS_NAMES:
-        build_page(target)
+def build(ctx, target=None, jobs=None, web_jobs=None, full=False,
+          webp=False):
+    page_builders_names = get_page_builders_names(PAGES_PATH)
+    report = {'stages': {}, 'builders': {}, 'urls': {}}
+    if target in page_builders_names:
+        report['builders'][target] = build_page(target)
     elif target == 'web':
-        build_web(app, WEB_BASE_URL, WEB_BUILD_PATH)
+        from pythoncz.web import app
+        report.update(build_web(app, WEB_BASE_URL, WEB_BUILD_PATH, web_jobs,
+                                full, webp))
     else:
-        for page_name in PAGE_BUILDERS_NAMES:
-            build_page(page_name)
-        build_web(app, WEB_BASE_URL, WEB_BUILD_PATH)
+        jobs = jobs or len(page_builders_names)
+        with measure() as report['stages']['pages']:
+            report['builders'] = build_pages(page_builders_names, jobs)
+        from pythoncz.web import app
+        web_report = build_web(app, WEB_BASE_URL, WEB_BUILD_PATH, web_jobs,
+                               full, webp)
+        report['stages'].update(web_report['stages'])
+        report['urls'] = web_report['urls']
+
+    log(f'Writing {BUILD_REPORT_PATH}')
+    write_report(BUILD_REPORT_PATH, report)
+    click.echo(format_summary(report))
+
+
+def get_page_builders_names(pages_path):
+    return sorted(
+        item.name for item in pages_path.iterdir()
+        if item.is_dir() and (item / '__main__.py').is_file()
+    )
 
 
 def build_page(name):
     log(f'Building data for {name}')
-    run(f'python -m pythoncz.pages.{name}')
-
+    # Builders run in-process only when building one at a time, so peak
+    # memory of the process would mix them together
+    with measure(peak_rss=False) as stats:
+        builder = importlib.import_module(f'pythoncz.pages.{name}.__main__')
+        builder.build()
+    return stats
+
+
+def build_pages(names, jobs):
+    if jobs == 1:
+        return {name: build_page(name) for name in names}
+
+    log(f'Building data for {", ".join(names)} ({jobs} at once)')
+    failed_names = []
+    builders_stats = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_page_builder, name): name
+                   for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            completed_process, builders_stats[name] = future.result()
+            click.echo(prefix_lines(completed_process.stdout, f'[{name}] '),
+                       nl=False)
+            if completed_process.returncode:
+                failed_names.append(name)
+                click.secho(f'Building data for {name} failed', fg='red')
+            else:
+                logger.info(f'Building data for {name} done')
+
+    if failed_names:
+        failed_names = ', '.join(sorted(failed_names))
+        raise click.ClickException(f'Page builders failed: {failed_names}')
+    return builders_stats
+
+
+def run_page_builder(name):
+    args = shlex.split(f'python -m pythoncz.pages.{name}')
+    wall_time = time.perf_counter()
+    with subprocess.Popen(args, cwd=PROJECT_PATH, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT,
+                          universal_newlines=True) as process:
+        stdout = process.stdout.read()
+        # Waiting for the process here instead of leaving it to Popen
+        # provides resource usage of this very process
+        _, status, rusage = os.wait4(process.pid, 0)
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+    wall_time = time.perf_counter() - wall_time
+    completed_process = subprocess.CompletedProcess(args, process.returncode,
+                                                    stdout)
+    return completed_process, rusage_to_stats(wall_time, rusage)
+
+
+def prefix_lines(text, prefix):
+    return ''.join(f'{prefix}{line}' for line in text.splitlines(True))
+
+
+def build_web(app, base_url, build_path, jobs=1, full=False, webp=False):
+    import flask_frozen
+    from pythoncz.cli.freezer import Freezer, ParallelFreezer
 
-def build_web(app, base_url, build_path):
     log(f'Building web into {build_path}')
     warnings.filterwarnings('error', category=flask_frozen.FrozenFlaskWarning)
 
     app.config['FREEZER_DESTINATION'] = build_path
     app.config['FREEZER_BASE_URL'] = base_url
     app.config['SERVER_NAME'] = urllib.parse.urlparse(base_url).netloc
-
-    freezer = flask_frozen.Freezer(app)
-    for page in freezer.freeze_yield():
-        logger.info(f'Web path {page.url} done')
+    # WebP versions of images are written after freezing
+    app.config['FREEZER_DESTINATION_IGNORE'] = ['*.png.webp']
+
+    try:
+        manifest = json.loads(WEB_BUILD_MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        manifest = {}
+    if full:
+        manifest = {}
+    inputs = get_web_inputs(app, base_url, build_path, date.today())
+    fresh_endpoints = get_fresh_endpoints(manifest.get('inputs'), inputs)
+    if fresh_endpoints:
+        logger.info(f"Skipping unchanged {', '.join(sorted(fresh_endpoints))}")
+
+    freezer_kwargs = dict(fresh_endpoints=fresh_endpoints,
+                          previous_urls=manifest.get('urls'))
+    if jobs == 1:
+        freezer = Freezer(app, **freezer_kwargs)
+    else:
+        freezer = ParallelFreezer(app, processes=jobs, **freezer_kwargs)
+    stages = {}
+    with measure() as stages['freeze']:
+        for page in freezer.freeze_yield():
+            logger.info(f'Web path {page.url} done')
+
+    CACHE_PATH.mkdir(exist_ok=True)
+    manifest = {'inputs': inputs, 'urls': freezer.urls}
+    WEB_BUILD_MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+
+    with measure() as stages['optimize']:
+        optimize_web(build_path, jobs, full)
+    with measure() as stages['images']:
+        optimize_web_images(build_path, jobs, webp)
+    return {'stages': stages, 'urls': freezer.stats}
+
+
+def optimize_web(build_path, jobs=1, full=False):
+    from pythoncz.cli.optimize import optimize_files
+
+    log(f'Minifying files in {build_path}')
+    try:
+        manifest = json.loads(OPTIMIZE_MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        manifest = {}
+    if full or manifest.get('build_path') != str(build_path):
+        manifest = {}
+
+    manifest = optimize_files(build_path, manifest, jobs,
+                              exclude=WEB_BUILD_EXTRA_NAMES)
+    manifest['build_path'] = str(build_path)
+    CACHE_PATH.mkdir(exist_ok=True)
+    OPTIMIZE_MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+
+
+def optimize_web_images(build_path, jobs=1, webp=False):
+    from pythoncz.cli.images import (WEBP_SUPPORTED, optimize_images,
+                                     find_png_optimizer, is_png_supported)
+
+    log(f'Optimizing images in {build_path}')
+    if webp and not WEBP_SUPPORTED:
+        click.secho('Pillow is not installed, skipping WebP', fg='yellow')
+    if (not is_png_supported(find_png_optimizer())
+            and any(build_path.glob('**/*.png'))):
+        click.secho('Neither oxipng, optipng nor Pillow is installed, '
+                    'skipping PNG optimization', fg='yellow')
+    for path in optimize_images(build_path, IMAGES_CACHE_PATH, jobs, webp):
+        logger.info(f'Image {path.relative_to(build_path)} optimized')
+
+
+def get_web_inputs(app, base_url, build_path, today):
+    from pythoncz.data import get_data_hash
+
+    endpoints = {}
+    for endpoint, view in app.view_functions.items():
+        if hasattr(view, 'data_paths'):
+            endpoints[endpoint] = {
+                'data': {str(data_path): get_data_hash(data_path)
+                         for data_path in view.data_paths},
+                'date': today.isoformat() if view.daily else None,
+            }
+    return {
+        'base_url': base_url,
+        'build_path': str(build_path),
+        'sources_hash': hash_files(get_web_sources(WEB_SOURCES_PATH),
+                                   WEB_SOURCES_PATH),
+        'endpoints': endpoints,
+    }
+
+
+def get_web_sources(sources_path):
+    return sorted(
+        path for path in sources_path.glob('**/*')
+        if path.is_file()
+        and not path.match('*_data.*')
+        and '__pycache__' not in path.parts
+    )
+
+
+def hash_files(paths, base_path):
+    files_hash = hashlib.sha256()
+    for path in paths:
+        files_hash.update(str(path.relative_to(base_path)).encode('utf-8'))
+        files_hash.update(b'\0')
+        files_hash.update(path.read_bytes())
+        files_hash.update(b'\0')
+    return files_hash.hexdigest()
+
+
+def get_fresh_endpoints(previous_inputs, inputs):
+    # Pages of an endpoint don't need to be rendered again if the website
+    # sources are the same as before and so are the endpoint's inputs
+    if not previous_inputs:
+        return set()
+    if any(previous_inputs.get(key) != value
+           for key, value in inputs.items() if key != 'endpoints'):
+        return set()
+
+    previous_endpoints = previous_inputs.get('endpoints', {})
+    return {
+        endpoint for endpoint, endpoint_inputs in inputs['endpoints'].items()
+        if None not in endpoint_inputs['data'].values()
+        and previous_endpoints.get(endpoint) == endpoint_inputs
+    }
 
 
 @cli.command()
 @click.argument('target', required=False)
-def deploy(target=None):
+@click.option('--dry-run', is_flag=True,
+              help='Only print what changed since the last deploy')
+@click.option('--force', is_flag=True,
+              help="Deploy even if nothing changed since the last deploy")
+def deploy(target=None, dry_run=False, force=False):
+    target = target or os.getenv('NOW_TARGET') or None
+    if not WEB_BUILD_PATH.is_dir():
+        raise click.ClickException(f"There's no build in {WEB_BUILD_PATH}, "
+                                   "run 'build web' first")
+
+    try:
+        deploy_manifest = json.loads(DEPLOY_MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        deploy_manifest = {}
+    manifest_key = target or 'preview'
+    files_hashes = hash_build_files(WEB_BUILD_PATH)
+    delta = diff_files_hashes(deploy_manifest.get(manifest_key, {}),
+                              files_hashes)
+
+    log(f'Changes since the last deploy to {manifest_key}')
+    click.echo(format_delta(delta, WEB_BUILD_PATH))
+    if dry_run:
+        return
+    if not any(delta.values()) and not force:
+        log('Nothing to deploy')
+        return
+
     now_config = json.loads(NOW_CONFIG_DEFAULTS.read_text())
     now_config['builds'] = to_now_builds([
-        path.relative_to(WEB_BUILD_PATH)
-        for path in WEB_BUILD_PATH.glob('**/*')
+        Path(name) for name in sorted(files_hashes)
     ])
 
     now_config_path = WEB_BUILD_PATH / 'now.json'
@@ -87,28 +362,88 @@ def deploy(target=None):
     token = os.getenv('NOW_TOKEN') or None
     token_option = f'--token={token}' if token else ''
 
-    target = target or os.getenv('NOW_TARGET') or None
     target_option = f'--target={target}' if target else ''
 
+    # Now deployments are immutable and always consist of all the files,
+    # but the 'now' tool uploads only files it doesn't have yet (by their
+    # SHA1), so in effect only the delta gets uploaded
     log(f'Deploying {WEB_BUILD_PATH} to {target}')
     run(f'now {WEB_BUILD_PATH} {target_option} {token_option}')
 
+    CACHE_PATH.mkdir(exist_ok=True)
+    deploy_manifest[manifest_key] = files_hashes
+    DEPLOY_MANIFEST_PATH.write_text(json.dumps(deploy_manifest, indent=2))
+
+
+def hash_build_files(build_path):
+    return {
+        str(path.relative_to(build_path)):
+            hashlib.sha256(path.read_bytes()).hexdigest()
+        for path in sorted(build_path.glob('**/*'))
+        if path.is_file()
+        and str(path.relative_to(build_path)) not in WEB_BUILD_EXTRA_NAMES
+    }
+
+
+def diff_files_hashes(previous_files_hashes, files_hashes):
+    previous_paths = set(previous_files_hashes)
+    paths = set(files_hashes)
+    return {
+        'added': sorted(paths - previous_paths),
+        'changed': sorted(
+            path for path in paths & previous_paths
+            if files_hashes[path] != previous_files_hashes[path]
+        ),
+        'removed': sorted(previous_paths - paths),
+    }
+
+
+def format_delta(delta, build_path):
+    lines = []
+    size = 0
+    for mark, key in (('+', 'added'), ('~', 'changed'), ('-', 'removed')):
+        for path in delta[key]:
+            if key == 'removed':
+                lines.append(f'{mark} {path}')
+            else:
+                path_size = (build_path / path).stat().st_size
+                size += path_size
+                lines.append(f'{mark} {path} ({path_size} B)')
+    counts = ', '.join(f'{len(delta[key])} {key}'
+                       for key in ('added', 'changed', 'removed'))
+    lines.append(f'{counts}, {size} B to upload')
+    return '\n'.join(lines)
+
 
 def to_now_builds(paths):
     # Beware! This function is taking care of 'now.sh builds', which are
     # something completely different than 'page builders' mentioned elsewhere
     # in the python.cz project.
-    return [path_to_now_build(path) for path in paths]
+    #
+    # Files are grouped by their suffix into glob patterns, so the number of
+    # builds doesn't grow with the number of pages. Only files without
+    # a suffix, or suffixes with mixed builders, get a build for each file.
+    groups = {}
+    for path in paths:
+        groups.setdefault(path.suffix, []).append(path_to_now_build(path))
+
+    builds = []
+    for suffix, group_builds in groups.items():
+        uses = {build['use'] for build in group_builds}
+        if suffix and len(uses) == 1:
+            builds.append({'src': f'**/*{suffix}', 'use': uses.pop()})
+        else:
+            builds.extend(group_builds)
+    return builds
 
 
 def path_to_now_build(path):
     # Beware! This function is taking care of 'now.sh builds', which are
     # something completely different than 'page builders' mentioned elsewhere
     # in the python.cz project.
-    if path.match('*.html'):
-        return {'src': str(path), 'use': '@now/html-minifier'}
-    if path.match('*.png'):
-        return {'src': str(path), 'use': '@now/optipng'}
+    #
+    # HTML gets minified and images optimized locally, see the 'optimize'
+    # and 'images' modules, so all files are deployed as they are.
     return {'src': str(path), 'use': '@now/static'}
 
 
@@ -0,0 +1,175 @@
+import os
+import signal
+import multiprocessing
+from unicodedata import normalize
+from concurrent.futures import ProcessPoolExecutor
+
+import flask_frozen
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from pythoncz.cli.report import measure
+
+
+class Freezer(flask_frozen.Freezer):
+    """
+    Frozen-Flask's Freezer, which can skip rendering pages of endpoints
+    whose inputs haven't changed since the previous build.
+
+    The 'previous_urls' come from the 'urls' attribute of the freezer used
+    for the previous build. For each URL they tell its endpoint and which
+    url_for() calls rendering the page made. When a page of one of the
+    'fresh_endpoints' is skipped, the calls get replayed, so the URLs they
+    point to still get frozen (and their files don't get removed as extra).
+
+    For each rendered URL the 'stats' attribute tells how long it took
+    and how much memory the process needed.
+    """
+
+    def __init__(self, app=None, fresh_endpoints=(), previous_urls=None,
+                 **kwargs):
+        self.fresh_endpoints = frozenset(fresh_endpoints)
+        self.previous_urls = previous_urls or {}
+        self.urls = {}
+        self.stats = {}
+        super().__init__(app, **kwargs)
+
+    def _build_one(self, url, *args):
+        filename = self.url_to_filename(url)
+        logged_calls = self.url_for_logger.logged_calls
+
+        previous = self.previous_urls.get(url)
+        if (previous
+                and previous['endpoint'] in self.fresh_endpoints
+                and os.path.isfile(filename)):
+            logged_calls.extend(map(tuple, previous['url_for_calls']))
+            self.urls[url] = previous
+            return filename
+
+        logged_calls_count = len(logged_calls)
+        # Pages render in the same process one after another, so its peak
+        # memory wouldn't say anything about the individual pages
+        with measure(peak_rss=False) as self.stats[url]:
+            filename = super()._build_one(url, *args)
+        self.urls[url] = {
+            'endpoint': self.get_endpoint(url),
+            'url_for_calls': list(logged_calls)[logged_calls_count:],
+        }
+        return filename
+
+    def get_endpoint(self, url):
+        adapter = self.app.url_map.bind('localhost')
+        try:
+            endpoint, _ = adapter.match(url, method='GET')
+        except (HTTPException, RequestRedirect):
+            return None
+        return endpoint
+
+    def url_to_filename(self, url):
+        destination_path = self.urlpath_to_filepath(url)
+        return os.path.join(self.root, *destination_path.split('/'))
+
+
+class ParallelFreezer(Freezer):
+    """
+    Frozen-Flask's Freezer, which renders the URLs on a pool of worker
+    processes. The output is the same as if the app was frozen serially.
+
+    Workers are forked from the current process, so they inherit the app
+    as well as the warnings filters. Each worker renders pages with its own
+    app and request contexts and sends the url_for() calls it has seen back,
+    so the URLs they point to get frozen in the next round. If a worker
+    dies, freezing fails with BrokenProcessPool.
+    """
+
+    def __init__(self, app=None, processes=None, **kwargs):
+        self.processes = processes
+        super().__init__(app, **kwargs)
+
+    def freeze_yield(self):
+        remove_extra = self.app.config['FREEZER_REMOVE_EXTRA_FILES']
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        if remove_extra:
+            ignore = self.app.config['FREEZER_DESTINATION_IGNORE']
+            previous_files = set(
+                normalize('NFC', os.path.join(self.root, *name.split('/')))
+                for name in flask_frozen.walk_directory(self.root,
+                                                        ignore=ignore)
+            )
+        seen_urls = set()
+        seen_endpoints = set()
+        built_files = set()
+
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(self.processes, mp_context=context,
+                                 initializer=init_worker,
+                                 initargs=(self,)) as executor:
+            while True:
+                urls = self._get_new_urls(seen_urls, seen_endpoints)
+                if not urls:
+                    break
+
+                # Workers would race each other creating the same directories
+                for url in urls:
+                    os.makedirs(os.path.dirname(self.url_to_filename(url)),
+                                exist_ok=True)
+
+                futures = [executor.submit(build_one, url) for url in urls]
+                try:
+                    for future in futures:
+                        url, filename, logged_calls, url_info, stats = (
+                            future.result()
+                        )
+                        self.url_for_logger.logged_calls.extend(logged_calls)
+                        self.urls[url] = url_info
+                        if stats:
+                            self.stats[url] = stats
+                        built_files.add(normalize('NFC', filename))
+                        yield flask_frozen.Page(
+                            url, os.path.relpath(filename, self.root)
+                        )
+                finally:
+                    # Leaving the executor waits for all submitted pages,
+                    # so on error (or Ctrl+C) only the running ones finish
+                    for future in futures:
+                        future.cancel()
+
+        self._check_endpoints(seen_endpoints)
+        if remove_extra:
+            remove_files(previous_files - built_files)
+
+    def _get_new_urls(self, seen_urls, seen_endpoints):
+        urls = []
+        # Newer Frozen-Flask yields also the last modified time
+        for url, endpoint, *_ in self._generate_all_urls():
+            seen_endpoints.add(endpoint)
+            if url not in seen_urls:
+                seen_urls.add(url)
+                urls.append(url)
+        return urls
+
+
+def remove_files(paths):
+    for path in paths:
+        os.remove(path)
+        parent = os.path.dirname(path)
+        if not os.listdir(parent):
+            os.removedirs(parent)
+
+
+worker_freezer = None
+
+
+def init_worker(freezer):
+    global worker_freezer
+    worker_freezer = freezer
+    # Ctrl+C is handled by the parent process, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def build_one(url):
+    filename = worker_freezer._build_one(url)
+    logged_calls = list(worker_freezer.url_for_logger.iter_calls())
+    return (url, filename, logged_calls, worker_freezer.urls[url],
+            worker_freezer.stats.get(url))
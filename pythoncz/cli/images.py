@@ -0,0 +1,138 @@
+import io
+import os
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+WEBP_SUPPORTED = Image is not None
+
+# Commands which losslessly optimize a PNG file in place, the first one
+# installed gets used
+PNG_OPTIMIZERS = (
+    ('oxipng', '--quiet', '--opt', '4'),
+    ('optipng', '-quiet', '-o2'),
+)
+
+
+def optimize_images(build_path, cache_path, jobs=1, webp=False):
+    """
+    Losslessly recompresses PNG images in the build (requires 'oxipng',
+    'optipng' or the 'Pillow' package) and optionally writes their WebP
+    siblings (requires 'Pillow').
+
+    Results are cached in the 'cache_path' directory by the hash of
+    the source image, so an image with the same content never gets encoded
+    twice. Returns paths of images which had to be encoded.
+    """
+    webp = webp and WEBP_SUPPORTED
+    png_optimizer = find_png_optimizer()
+    png = is_png_supported(png_optimizer)
+    remove_orphaned_webp(build_path)
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    paths = sorted(build_path.glob('**/*.png'))
+    optimize = partial(optimize_image, cache_path=cache_path, png=png,
+                       png_optimizer=png_optimizer, webp=webp)
+    if jobs == 1:
+        encoded = list(map(optimize, paths))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            encoded = list(executor.map(optimize, paths, chunksize=4))
+    return [path for path, is_encoded in zip(paths, encoded) if is_encoded]
+
+
+def remove_orphaned_webp(build_path):
+    for path in build_path.glob('**/*.png.webp'):
+        if not path.with_suffix('').is_file():
+            path.unlink()
+
+
+def optimize_image(path, cache_path, png=True, png_optimizer=None,
+                   webp=False):
+    content = path.read_bytes()
+    content_hash = hashlib.sha256(content).hexdigest()
+    is_encoded = False
+
+    if png:
+        png_cache_path = cache_path / f'{content_hash}.png'
+        try:
+            optimized_content = png_cache_path.read_bytes()
+        except FileNotFoundError:
+            optimized_content = optimize_png(content, png_optimizer)
+            is_encoded = True
+            write_cache(png_cache_path, optimized_content)
+            # Optimizing the result again wouldn't make it any smaller
+            optimized_hash = hashlib.sha256(optimized_content).hexdigest()
+            write_cache(cache_path / f'{optimized_hash}.png',
+                        optimized_content)
+        if optimized_content != content:
+            path.write_bytes(optimized_content)
+
+    if webp:
+        webp_path = path.with_name(path.name + '.webp')
+        webp_cache_path = cache_path / f'{content_hash}.webp'
+        try:
+            webp_content = webp_cache_path.read_bytes()
+        except FileNotFoundError:
+            webp_content = convert_to_webp(content)
+            is_encoded = True
+            write_cache(webp_cache_path, webp_content)
+        if not webp_path.is_file() or webp_path.read_bytes() != webp_content:
+            webp_path.write_bytes(webp_content)
+    return is_encoded
+
+
+def write_cache(path, content):
+    # Other workers could be reading the same cache file at the same time
+    temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    temp_path.write_bytes(content)
+    os.replace(temp_path, path)
+
+
+def find_png_optimizer():
+    for args in PNG_OPTIMIZERS:
+        if shutil.which(args[0]):
+            return args
+    return None
+
+
+def is_png_supported(png_optimizer):
+    return bool(png_optimizer) or Image is not None
+
+
+def optimize_png(content, png_optimizer=None):
+    """
+    Losslessly recompresses given PNG with the 'png_optimizer' command
+    (see 'PNG_OPTIMIZERS'), or if there's none, with Pillow. Returns
+    the original content if it can't be made any smaller.
+    """
+    if png_optimizer:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'image.png'
+            path.write_bytes(content)
+            subprocess.run([*png_optimizer, str(path)], check=True)
+            optimized_content = path.read_bytes()
+    else:
+        buffer = io.BytesIO()
+        Image.open(io.BytesIO(content)).save(buffer, 'PNG', optimize=True)
+        optimized_content = buffer.getvalue()
+    if len(optimized_content) < len(content):
+        return optimized_content
+    return content
+
+
+def convert_to_webp(content):
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(content)).save(buffer, 'WEBP', lossless=True,
+                                         method=6)
+    return buffer.getvalue()
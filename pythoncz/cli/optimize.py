@@ -0,0 +1,110 @@
+import re
+import json
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+
+# Whitespace is significant in these and their content is left as it is
+PRESERVED_HTML_RE = re.compile(r'(<(pre|textarea)\b.*?</\2\s*>)',
+                               re.IGNORECASE | re.DOTALL)
+
+
+def optimize_files(build_path, manifest=None, jobs=1, exclude=()):
+    """
+    Minifies the HTML, XML and JSON files in the build. Compression is left
+    to the hosting, which serves whatever encoding the browser accepts.
+
+    The 'manifest' is the return value of the previous run. It tells
+    the content hashes of the files as this function left them, so files
+    which haven't been overwritten since are skipped. Files with names
+    listed in 'exclude' (relative to the 'build_path') are left alone.
+    """
+    manifest = manifest or {}
+
+    paths = get_optimized_paths(build_path, exclude)
+    previous_hashes = manifest.get('hashes', {})
+    new_manifest = {'hashes': {}}
+    stale_paths = []
+    for path in paths:
+        name = str(path.relative_to(build_path))
+        if hash_bytes(path.read_bytes()) == previous_hashes.get(name):
+            new_manifest['hashes'][name] = previous_hashes[name]
+        else:
+            stale_paths.append(path)
+
+    if jobs == 1:
+        hashes = list(map(optimize_file, stale_paths))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            hashes = list(executor.map(optimize_file, stale_paths,
+                                       chunksize=8))
+    for path, file_hash in zip(stale_paths, hashes):
+        new_manifest['hashes'][str(path.relative_to(build_path))] = file_hash
+    return new_manifest
+
+
+def get_optimized_paths(build_path, exclude=()):
+    exclude = {build_path / name for name in exclude}
+    return [
+        path for path in sorted(build_path.glob('**/*'))
+        if path.is_file() and path.suffix in MINIFIERS
+        and path not in exclude
+    ]
+
+
+def optimize_file(path):
+    path = Path(path)
+    content = path.read_bytes()
+    minified_content = MINIFIERS[path.suffix](content)
+    if minified_content != content:
+        path.write_bytes(minified_content)
+    return hash_bytes(minified_content)
+
+
+def hash_bytes(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def minify_html(content):
+    # Lines are only stripped of indentation and blank lines are dropped,
+    # but line breaks are kept, so the whitespace between inline elements
+    # renders the same way as before
+    parts = PRESERVED_HTML_RE.split(content.decode('utf-8'))
+    minified_parts = []
+    for i, part in enumerate(parts):
+        if i % 3 == 0:
+            lines = (line.strip() for line in part.splitlines())
+            minified_part = '\n'.join(line for line in lines if line)
+            # Keep a line break where the text touches a preserved element
+            head = '\n' if i > 0 and part[:1].isspace() else ''
+            tail = '\n' if i < len(parts) - 1 and part[-1:].isspace() else ''
+            if minified_part:
+                minified_part = head + minified_part + tail
+            else:
+                minified_part = head or tail
+            minified_parts.append(minified_part)
+        elif i % 3 == 1:
+            minified_parts.append(part)
+    return ''.join(minified_parts).encode('utf-8')
+
+
+def minify_xml(content):
+    parser = etree.XMLParser(remove_blank_text=True, resolve_entities=False)
+    tree = etree.fromstring(content, parser).getroottree()
+    return etree.tostring(tree, xml_declaration=True, encoding='utf-8')
+
+
+def minify_json(content):
+    data = json.loads(content.decode('utf-8'))
+    return json.dumps(data, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+MINIFIERS = {
+    '.html': minify_html,
+    '.xml': minify_xml,
+    '.json': minify_json,
+}
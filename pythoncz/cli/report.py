@@ -0,0 +1,90 @@
+import sys
+import json
+import time
+import resource
+from contextlib import contextmanager
+
+
+# On Linux the maximum resident set size is in kilobytes, on macOS in bytes
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+@contextmanager
+def measure(peak_rss=True):
+    """
+    Measures the wall time and CPU time spent in the block, and unless
+    'peak_rss' is false, the peak resident set size the current process has
+    reached by the end of it. The numbers are filled into the yielded dict
+    when the block is left.
+
+    The peak is the high-water mark of the whole process, not of the block,
+    so it doesn't tell much about blocks which run many times over
+    in the same process.
+    """
+    stats = {}
+    wall_time = time.perf_counter()
+    cpu_time = time.process_time()
+    try:
+        yield stats
+    finally:
+        stats['wall_time'] = time.perf_counter() - wall_time
+        stats['cpu_time'] = time.process_time() - cpu_time
+        if peak_rss:
+            stats['peak_rss'] = get_peak_rss(resource.getrusage(
+                resource.RUSAGE_SELF
+            ))
+
+
+def rusage_to_stats(wall_time, rusage):
+    return {
+        'wall_time': wall_time,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'peak_rss': get_peak_rss(rusage),
+    }
+
+
+def get_peak_rss(rusage):
+    return rusage.ru_maxrss * MAXRSS_UNIT
+
+
+def write_report(report_path, report):
+    """
+    Merges the report into the one already saved at 'report_path'. Each
+    section of the report maps names to stats, which replace the stats
+    saved under the same names. The rest is kept, so building a single
+    target doesn't lose numbers of the last full build.
+    """
+    try:
+        merged_report = json.loads(report_path.read_text())
+    except (FileNotFoundError, ValueError):
+        merged_report = {}
+    for section, items in report.items():
+        merged_report.setdefault(section, {}).update(items)
+
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(merged_report, indent=2,
+                                      sort_keys=True))
+    return merged_report
+
+
+def format_summary(report, limit=5):
+    lines = []
+    for key, title in (('stages', 'Stages'), ('builders', 'Page builders'),
+                       ('urls', 'Slowest web pages')):
+        items = sorted(report.get(key, {}).items(),
+                       key=lambda item: item[1]['wall_time'], reverse=True)
+        if not items:
+            continue
+        lines.append(f'{title}:')
+        if key == 'urls':
+            items = items[:limit]
+        for name, stats in items:
+            lines.append(f'  {format_stats(stats)}  {name}')
+    return '\n'.join(lines)
+
+
+def format_stats(stats):
+    text = f"{stats['wall_time']:7.2f}s wall {stats['cpu_time']:7.2f}s CPU"
+    if 'peak_rss' in stats:
+        text += f" {stats['peak_rss'] / 2 ** 20:7.1f} MiB"
+    return text
@@ -1,10 +1,43 @@
+import os
+import hashlib
 from pathlib import Path
 
 import pytest
+from click.testing import CliRunner
 
 from pythoncz import cli
 
 
+IMPORT_TIME_BUDGET = 0.15  # seconds
+
+
+def test_cli_imports_only_what_it_needs(import_module):
+    modules, _ = import_module('pythoncz.cli')
+
+    assert 'pythoncz.web' not in modules
+    assert 'flask' not in modules
+    assert 'flask_frozen' not in modules
+    assert 'lxml' not in modules
+
+
+@pytest.mark.skipif(os.environ.get('CI') == 'true',
+                    reason='import time varies on shared CI machines')
+def test_cli_import_time_budget(import_module):
+    _, cumulative_time = import_module('pythoncz.cli')
+
+    assert cumulative_time < IMPORT_TIME_BUDGET
+
+
+def test_get_page_builders_names(tmp_path):
+    for name in ('articles', 'events', 'templates'):
+        (tmp_path / name).mkdir()
+    (tmp_path / 'articles' / '__main__.py').write_text('')
+    (tmp_path / 'events' / '__main__.py').write_text('')
+    (tmp_path / 'README.md').write_text('')
+
+    assert cli.get_page_builders_names(tmp_path) == ['articles', 'events']
+
+
 def test_to_now_builds():
     assert cli.to_now_builds([
         Path('index.html'),
@@ -12,17 +45,30 @@ def test_to_now_builds():
         Path('images/avatar.png'),
         Path('robots.txt'),
     ]) == [
-        {'src': 'index.html', 'use': '@now/html-minifier'},
-        {'src': 'pages/index.html', 'use': '@now/html-minifier'},
-        {'src': 'images/avatar.png', 'use': '@now/optipng'},
-        {'src': 'robots.txt', 'use': '@now/static'},
+        {'src': '**/*.html', 'use': '@now/static'},
+        {'src': '**/*.png', 'use': '@now/static'},
+        {'src': '**/*.txt', 'use': '@now/static'},
+    ]
+
+
+def test_to_now_builds_without_suffix():
+    assert cli.to_now_builds([
+        Path('index.html'),
+        Path('CNAME'),
+        Path('.well-known/security'),
+    ]) == [
+        {'src': '**/*.html', 'use': '@now/static'},
+        {'src': 'CNAME', 'use': '@now/static'},
+        {'src': '.well-known/security', 'use': '@now/static'},
     ]
 
 
 @pytest.mark.parametrize('path,expected_src,expected_use', [
-    (Path('index.html'), 'index.html', '@now/html-minifier'),
-    (Path('foo/bar/index.html'), 'foo/bar/index.html', '@now/html-minifier'),
-    (Path('image.png'), 'image.png', '@now/optipng'),
+    (Path('index.html'), 'index.html', '@now/static'),
+    (Path('foo/bar/index.html'), 'foo/bar/index.html', '@now/static'),
+    (Path('feed.xml'), 'feed.xml', '@now/static'),
+    (Path('image.png'), 'image.png', '@now/static'),
+    (Path('image.png.webp'), 'image.png.webp', '@now/static'),
     (Path('image.jpg'), 'image.jpg', '@now/static'),
     (Path('robots.txt'), 'robots.txt', '@now/static'),
 ])
@@ -31,3 +77,167 @@ def test_path_to_now_build(path, expected_src, expected_use):
         'src': expected_src,
         'use': expected_use,
     }
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('', ''),
+    ('Downloading\n', '[jobs] Downloading\n'),
+    ('Downloading\nDone', '[jobs] Downloading\n[jobs] Done'),
+])
+def test_prefix_lines(text, expected):
+    assert cli.prefix_lines(text, '[jobs] ') == expected
+
+
+def inputs(**kwargs):
+    return {
+        'base_url': 'https://python.cz',
+        'build_path': '/project/build',
+        'sources_hash': 'abc',
+        'endpoints': {
+            'index': {'data': {}, 'date': None},
+            'articles': {'data': {'articles_data.json': '123'}, 'date': None},
+            'events': {'data': {'events_data.json': '456'},
+                       'date': '2019-03-07'},
+        },
+        **kwargs,
+    }
+
+
+def test_get_fresh_endpoints():
+    assert cli.get_fresh_endpoints(inputs(), inputs()) == {
+        'index', 'articles', 'events',
+    }
+
+
+@pytest.mark.parametrize('previous_inputs', [
+    None,
+    {},
+    inputs(sources_hash='def'),
+    inputs(base_url='https://example.com'),
+    inputs(build_path='/project/web'),
+])
+def test_get_fresh_endpoints_all_changed(previous_inputs):
+    assert cli.get_fresh_endpoints(previous_inputs, inputs()) == set()
+
+
+def test_get_fresh_endpoints_some_changed():
+    current_inputs = inputs()
+    current_inputs['endpoints']['articles']['data'] = {
+        'articles_data.json': '789',
+    }
+    current_inputs['endpoints']['events']['date'] = '2019-03-08'
+
+    assert cli.get_fresh_endpoints(inputs(), current_inputs) == {'index'}
+
+
+def test_get_fresh_endpoints_missing_data():
+    previous_inputs = inputs()
+    previous_inputs['endpoints']['articles']['data'] = {
+        'articles_data.json': None,
+    }
+
+    assert cli.get_fresh_endpoints(previous_inputs, previous_inputs) == {
+        'index', 'events',
+    }
+
+
+def test_hash_files(tmp_path):
+    (tmp_path / 'a.txt').write_text('a')
+    (tmp_path / 'b.txt').write_text('b')
+    paths = [tmp_path / 'a.txt', tmp_path / 'b.txt']
+    files_hash = cli.hash_files(paths, tmp_path)
+
+    assert cli.hash_files(paths, tmp_path) == files_hash
+
+    (tmp_path / 'b.txt').write_text('c')
+
+    assert cli.hash_files(paths, tmp_path) != files_hash
+
+
+def test_get_web_sources(tmp_path):
+    (tmp_path / 'pages' / 'events' / '__pycache__').mkdir(parents=True)
+    (tmp_path / 'pages' / 'events' / 'views.py').write_text('')
+    (tmp_path / 'pages' / 'events' / 'events_data.json').write_text('')
+    (tmp_path / 'pages' / 'events' / 'events_data.sha256').write_text('')
+    (tmp_path / 'pages' / 'events' / '__pycache__' / 'x.pyc').write_text('')
+    (tmp_path / 'index.html').write_text('')
+
+    assert cli.get_web_sources(tmp_path) == [
+        tmp_path / 'index.html',
+        tmp_path / 'pages' / 'events' / 'views.py',
+    ]
+
+
+def test_hash_build_files(tmp_path):
+    (tmp_path / 'articles').mkdir()
+    (tmp_path / 'articles' / 'index.html').write_text('Articles')
+    (tmp_path / 'index.html').write_text('Index')
+    (tmp_path / 'now.json').write_text('{}')
+
+    assert cli.hash_build_files(tmp_path) == {
+        'articles/index.html': hashlib.sha256(b'Articles').hexdigest(),
+        'index.html': hashlib.sha256(b'Index').hexdigest(),
+    }
+
+
+def test_diff_files_hashes():
+    assert cli.diff_files_hashes({
+        'index.html': '1',
+        'articles/index.html': '2',
+        'events/index.html': '3',
+    }, {
+        'index.html': '1',
+        'articles/index.html': '4',
+        'jobs/index.html': '5',
+    }) == {
+        'added': ['jobs/index.html'],
+        'changed': ['articles/index.html'],
+        'removed': ['events/index.html'],
+    }
+
+
+def test_format_delta(tmp_path):
+    (tmp_path / 'index.html').write_text('Index')
+    (tmp_path / 'robots.txt').write_text('User-agent: *')
+
+    assert cli.format_delta({
+        'added': ['index.html'],
+        'changed': ['robots.txt'],
+        'removed': ['events/index.html'],
+    }, tmp_path) == '\n'.join([
+        '+ index.html (5 B)',
+        '~ robots.txt (13 B)',
+        '- events/index.html',
+        '1 added, 1 changed, 1 removed, 18 B to upload',
+    ])
+
+
+@pytest.mark.parametrize('png_name,expected', [
+    ('logo.png', True),
+    ('logo.svg', False),
+])
+def test_optimize_web_images_warns_about_skipped_png(tmp_path, monkeypatch,
+                                                     capsys, png_name,
+                                                     expected):
+    from pythoncz.cli import images
+
+    monkeypatch.setattr(images, 'PNG_OPTIMIZERS', ())
+    monkeypatch.setattr(images, 'Image', None)
+    monkeypatch.setattr(cli, 'IMAGES_CACHE_PATH', tmp_path / 'cache')
+    (tmp_path / 'build').mkdir()
+    (tmp_path / 'build' / png_name).write_bytes(b'\x89PNG')
+    cli.optimize_web_images(tmp_path / 'build')
+
+    assert ('skipping PNG optimization' in capsys.readouterr().out) == (
+        expected
+    )
+
+
+def test_deploy_without_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(cli, 'WEB_BUILD_PATH', tmp_path / 'build')
+    monkeypatch.setattr(cli, 'DEPLOY_MANIFEST_PATH',
+                        tmp_path / 'deploy_manifest.json')
+    result = CliRunner().invoke(cli.deploy, ['--dry-run'])
+
+    assert result.exit_code == 1
+    assert "There's no build" in result.output
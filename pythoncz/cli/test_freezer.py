@@ -0,0 +1,155 @@
+import os
+import json
+import warnings
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+import flask_frozen
+from flask import Flask, Response, url_for
+
+from pythoncz.cli.freezer import Freezer, ParallelFreezer
+
+
+def create_app(build_path):
+    app = Flask(__name__)
+    app.config['FREEZER_DESTINATION'] = str(build_path)
+
+    @app.route('/')
+    def index():
+        links = [url_for('article', number=number) for number in range(20)]
+        return '\n'.join(links)
+
+    @app.route('/articles/<int:number>/')
+    def article(number):
+        return f'Article {number} {url_for("feed", number=number)}'
+
+    @app.route('/feeds/<int:number>.xml')
+    def feed(number):
+        return Response(f'<feed>{number}</feed>', mimetype='application/xml')
+
+    return app
+
+
+def read_files(build_path):
+    return {str(path.relative_to(build_path)): path.read_bytes()
+            for path in build_path.glob('**/*') if path.is_file()}
+
+
+def test_parallel_freezer_same_as_freezer(tmp_path):
+    serial_path = tmp_path / 'serial'
+    parallel_path = tmp_path / 'parallel'
+
+    serial_urls = flask_frozen.Freezer(create_app(serial_path)).freeze()
+    parallel_urls = ParallelFreezer(create_app(parallel_path),
+                                    processes=4).freeze()
+
+    assert parallel_urls == serial_urls
+    assert len(parallel_urls) == 41
+    assert read_files(parallel_path) == read_files(serial_path)
+
+
+def test_parallel_freezer_removes_extra_files(tmp_path):
+    build_path = tmp_path / 'build'
+    (build_path / 'old').mkdir(parents=True)
+    (build_path / 'old' / 'index.html').write_text('Old')
+
+    ParallelFreezer(create_app(build_path), processes=2).freeze()
+
+    assert not (build_path / 'old').exists()
+
+
+def test_parallel_freezer_warnings_are_errors(tmp_path):
+    app = create_app(tmp_path)
+
+    @app.route('/feed.json')
+    def feed_json():
+        return 'not JSON'
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings('error',
+                                category=flask_frozen.FrozenFlaskWarning)
+        with pytest.raises(flask_frozen.MimetypeMismatchWarning):
+            ParallelFreezer(app, processes=2).freeze()
+
+
+def test_parallel_freezer_worker_exits(tmp_path):
+    app = create_app(tmp_path)
+    view = app.view_functions['article']
+
+    def exiting_view(number):
+        if number == 3:
+            os._exit(1)
+        return view(number)
+    app.view_functions['article'] = exiting_view
+
+    with pytest.raises(BrokenProcessPool):
+        ParallelFreezer(app, processes=2).freeze()
+
+
+def create_counting_app(build_path, calls):
+    app = create_app(build_path)
+    for endpoint in ('index', 'article'):
+        view = app.view_functions[endpoint]
+
+        def counting_view(*args, view=view, endpoint=endpoint, **kwargs):
+            calls.append(endpoint)
+            return view(*args, **kwargs)
+        app.view_functions[endpoint] = counting_view
+    return app
+
+
+@pytest.mark.parametrize('freezer_cls', [Freezer, ParallelFreezer])
+def test_freezer_skips_fresh_endpoints(tmp_path, freezer_cls):
+    calls = []
+    freezer = Freezer(create_counting_app(tmp_path, calls))
+    freezer.freeze()
+    files = read_files(tmp_path)
+
+    calls.clear()
+    freezer = freezer_cls(create_counting_app(tmp_path, calls),
+                          fresh_endpoints=['index', 'article'],
+                          previous_urls=json.loads(json.dumps(freezer.urls)))
+    urls = freezer.freeze()
+
+    assert calls == []
+    assert len(urls) == 41
+    assert read_files(tmp_path) == files
+
+
+def test_freezer_renders_missing_files_of_fresh_endpoints(tmp_path):
+    calls = []
+    freezer = Freezer(create_counting_app(tmp_path, calls))
+    freezer.freeze()
+    (tmp_path / 'articles' / '3' / 'index.html').unlink()
+
+    calls.clear()
+    Freezer(create_counting_app(tmp_path, calls),
+            fresh_endpoints=['index', 'article'],
+            previous_urls=freezer.urls).freeze()
+
+    assert calls == ['article']
+    assert (tmp_path / 'articles' / '3' / 'index.html').is_file()
+
+
+def test_freezer_urls(tmp_path):
+    freezer = Freezer(create_app(tmp_path))
+    freezer.freeze()
+
+    assert freezer.urls['/'] == {
+        'endpoint': 'index',
+        'url_for_calls': [('article', {'number': number})
+                          for number in range(20)],
+    }
+    assert freezer.urls['/feeds/1.xml'] == {
+        'endpoint': 'feed',
+        'url_for_calls': [],
+    }
+
+
+@pytest.mark.parametrize('freezer_cls', [Freezer, ParallelFreezer])
+def test_freezer_stats(tmp_path, freezer_cls):
+    freezer = freezer_cls(create_app(tmp_path))
+    urls = freezer.freeze()
+
+    assert sorted(freezer.stats) == sorted(urls)
+    assert sorted(freezer.stats['/']) == ['cpu_time', 'wall_time']
@@ -0,0 +1,160 @@
+import sys
+import zlib
+import hashlib
+
+import pytest
+
+from pythoncz.cli import images
+
+
+FAKE_OPTIMIZER = """
+import sys
+from pathlib import Path
+
+path = Path(sys.argv[-1])
+content = path.read_bytes()
+path.write_bytes(content[:8] if sys.argv[1] == 'smaller' else content * 2)
+"""
+
+
+def create_png(width=64, height=64):
+    # Poorly compressed RGB image
+    def chunk(chunk_type, chunk_data):
+        return (len(chunk_data).to_bytes(4, 'big') + chunk_type + chunk_data
+                + zlib.crc32(chunk_type + chunk_data).to_bytes(4, 'big'))
+
+    header = (width.to_bytes(4, 'big') + height.to_bytes(4, 'big')
+              + bytes([8, 2, 0, 0, 0]))
+    rows = b''.join(b'\0' + bytes([(x * y) % 256 for x in range(width)] * 3)
+                    for y in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(rows, 0)) + chunk(b'IEND', b''))
+
+
+@pytest.fixture
+def fake_optimizer(tmp_path, monkeypatch):
+    script_path = tmp_path / 'fake_optimizer.py'
+    script_path.write_text(FAKE_OPTIMIZER)
+    optimizer = (sys.executable, str(script_path), 'smaller')
+    monkeypatch.setattr(images, 'PNG_OPTIMIZERS', (optimizer,))
+    return optimizer
+
+
+def test_find_png_optimizer(monkeypatch):
+    monkeypatch.setattr(images.shutil, 'which',
+                        lambda name: name if name == 'optipng' else None)
+
+    assert images.find_png_optimizer()[0] == 'optipng'
+
+
+def test_find_png_optimizer_missing(monkeypatch):
+    monkeypatch.setattr(images.shutil, 'which', lambda name: None)
+
+    assert images.find_png_optimizer() is None
+
+
+@pytest.mark.parametrize('mode,expected', [
+    ('smaller', create_png()[:8]),
+    ('larger', create_png()),
+])
+def test_optimize_png_with_optimizer(fake_optimizer, mode, expected):
+    optimizer = fake_optimizer[:-1] + (mode,)
+
+    assert images.optimize_png(create_png(), optimizer) == expected
+
+
+@pytest.mark.skipif(images.Image is None, reason='requires Pillow')
+def test_optimize_png_with_pillow():
+    content = create_png()
+    optimized_content = images.optimize_png(content)
+
+    assert len(optimized_content) < len(content)
+    assert (list(images.Image.open(images.io.BytesIO(content)).getdata())
+            == list(images.Image.open(images.io.BytesIO(optimized_content))
+                    .getdata()))
+
+
+@pytest.fixture
+def build_path(tmp_path):
+    build_path = tmp_path / 'build'
+    (build_path / 'static').mkdir(parents=True)
+    (build_path / 'static' / 'logo.png').write_bytes(create_png())
+    (build_path / 'static' / 'icon.png').write_bytes(create_png(16, 16))
+    (build_path / 'index.html').write_text('<img src="static/logo.png">')
+    return build_path
+
+
+def test_optimize_images(build_path, tmp_path, fake_optimizer):
+    cache_path = tmp_path / 'cache'
+    encoded = images.optimize_images(build_path, cache_path)
+
+    assert encoded == [build_path / 'static' / 'icon.png',
+                       build_path / 'static' / 'logo.png']
+    assert (build_path / 'static' / 'logo.png').read_bytes() == (
+        create_png()[:8]
+    )
+
+
+def test_is_png_supported(monkeypatch):
+    monkeypatch.setattr(images, 'Image', None)
+
+    assert images.is_png_supported(('optipng',))
+    assert not images.is_png_supported(None)
+
+
+def test_optimize_images_without_optimizer(build_path, tmp_path,
+                                           monkeypatch):
+    monkeypatch.setattr(images, 'PNG_OPTIMIZERS', ())
+    monkeypatch.setattr(images, 'Image', None)
+    cache_path = tmp_path / 'cache'
+
+    assert images.optimize_images(build_path, cache_path) == []
+    assert (build_path / 'static' / 'logo.png').read_bytes() == create_png()
+    assert not list(cache_path.iterdir())
+
+
+def test_optimize_images_cached(build_path, tmp_path, monkeypatch,
+                                fake_optimizer):
+    cache_path = tmp_path / 'cache'
+    images.optimize_images(build_path, cache_path)
+    (build_path / 'static' / 'logo.png').write_bytes(create_png())
+
+    def optimize_png(content, png_optimizer=None):
+        raise AssertionError('Image should have been cached')
+
+    monkeypatch.setattr(images, 'optimize_png', optimize_png)
+
+    assert images.optimize_images(build_path, cache_path) == []
+    content_hash = hashlib.sha256(create_png()).hexdigest()
+    assert (build_path / 'static' / 'logo.png').read_bytes() == (
+        (cache_path / f'{content_hash}.png').read_bytes()
+    )
+
+
+def test_optimize_images_in_parallel(build_path, tmp_path, fake_optimizer):
+    cache_path = tmp_path / 'cache'
+    encoded = images.optimize_images(build_path, cache_path, jobs=2)
+
+    assert len(encoded) == 2
+    assert (build_path / 'static' / 'icon.png').read_bytes() == (
+        create_png(16, 16)[:8]
+    )
+    assert not list(cache_path.glob('*.tmp'))
+
+
+def test_optimize_images_removes_orphaned_webp(build_path, tmp_path):
+    (build_path / 'static' / 'old.png.webp').write_bytes(b'RIFF')
+    (build_path / 'static' / 'logo.png.webp').write_bytes(b'RIFF')
+
+    images.optimize_images(build_path, tmp_path / 'cache')
+
+    assert not (build_path / 'static' / 'old.png.webp').exists()
+    assert (build_path / 'static' / 'logo.png.webp').exists()
+
+
+@pytest.mark.skipif(not images.WEBP_SUPPORTED, reason='requires Pillow')
+def test_optimize_images_webp(build_path, tmp_path):
+    images.optimize_images(build_path, tmp_path / 'cache', webp=True)
+
+    webp_content = (build_path / 'static' / 'logo.png.webp').read_bytes()
+    assert webp_content.startswith(b'RIFF')
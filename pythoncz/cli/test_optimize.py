@@ -0,0 +1,104 @@
+import pytest
+
+from pythoncz.cli import optimize
+
+
+@pytest.mark.parametrize('content,expected', [
+    (b'', b''),
+    (b'<p>\n    <a href="/">Index</a>\n</p>\n',
+     b'<p>\n<a href="/">Index</a>\n</p>'),
+    (b'<ul>\n\n    <li>Pyvo</li>\n\n</ul>',
+     b'<ul>\n<li>Pyvo</li>\n</ul>'),
+    (b'<div>\n  <pre>\n  a\n\n    b\n</pre>\n</div>',
+     b'<div>\n<pre>\n  a\n\n    b\n</pre>\n</div>'),
+    (b'Text <PRE class="code">  x </PRE> text',
+     b'Text\n<PRE class="code">  x </PRE>\ntext'),
+    (b'<pre> a </pre>\n  \n<textarea> b </textarea>',
+     b'<pre> a </pre>\n<textarea> b </textarea>'),
+    ('<p>\n  Příliš žluťoučký kůň\n</p>'.encode('utf-8'),
+     '<p>\nPříliš žluťoučký kůň\n</p>'.encode('utf-8')),
+])
+def test_minify_html(content, expected):
+    assert optimize.minify_html(content) == expected
+
+
+def test_minify_xml():
+    content = (b'<?xml version="1.0" encoding="utf-8"?>\n'
+               b'<feed>\n  <title> Articles </title>\n'
+               b'  <entry>\n    <title>Pyvo</title>\n  </entry>\n</feed>\n')
+
+    assert optimize.minify_xml(content) == (
+        b"<?xml version='1.0' encoding='utf-8'?>\n"
+        b'<feed><title> Articles </title>'
+        b'<entry><title>Pyvo</title></entry></feed>'
+    )
+
+
+def test_minify_json():
+    content = '{\n  "name": "Pyvo",\n  "tags": [\n    "Brno"\n  ]\n}'
+
+    assert optimize.minify_json(content.encode('utf-8')) == (
+        b'{"name":"Pyvo","tags":["Brno"]}'
+    )
+
+
+@pytest.fixture
+def build_path(tmp_path):
+    (tmp_path / 'events').mkdir()
+    (tmp_path / 'index.html').write_text('<p>\n  Index\n</p>\n')
+    (tmp_path / 'events' / 'index.html').write_text('<p>\n  Events\n</p>\n')
+    (tmp_path / 'events' / 'calendar.ics').write_text('BEGIN:VCALENDAR\r\n')
+    (tmp_path / 'robots.txt').write_text('User-agent: *\n')
+    return tmp_path
+
+
+def list_files(path):
+    return sorted(str(item.relative_to(path))
+                  for item in path.glob('**/*') if item.is_file())
+
+
+def test_optimize_files(build_path):
+    manifest = optimize.optimize_files(build_path)
+
+    assert list_files(build_path) == ['events/calendar.ics',
+                                      'events/index.html', 'index.html',
+                                      'robots.txt']
+    assert (build_path / 'index.html').read_text() == '<p>\nIndex\n</p>'
+    assert (build_path / 'events' / 'calendar.ics').read_bytes() == (
+        b'BEGIN:VCALENDAR\r\n'
+    )
+    assert sorted(manifest['hashes']) == ['events/index.html', 'index.html']
+
+
+def test_optimize_files_in_parallel(build_path, tmp_path_factory):
+    serial_build_path = tmp_path_factory.mktemp('serial')
+    for name in list_files(build_path):
+        (serial_build_path / name).parent.mkdir(exist_ok=True)
+        content = (build_path / name).read_bytes()
+        (serial_build_path / name).write_bytes(content)
+
+    manifest = optimize.optimize_files(build_path, jobs=2)
+
+    assert manifest == optimize.optimize_files(serial_build_path)
+    assert list_files(build_path) == list_files(serial_build_path)
+    for name in list_files(build_path):
+        assert ((build_path / name).read_bytes()
+                == (serial_build_path / name).read_bytes())
+
+
+def test_optimize_files_skips_unchanged(build_path, monkeypatch):
+    manifest = optimize.optimize_files(build_path)
+    (build_path / 'index.html').write_text('<p>\n  Index!\n</p>\n')
+
+    optimized_paths = []
+
+    def optimize_file(path):
+        optimized_paths.append(path)
+        return 'hash'
+
+    monkeypatch.setattr(optimize, 'optimize_file', optimize_file)
+    new_manifest = optimize.optimize_files(build_path, manifest)
+
+    assert optimized_paths == [build_path / 'index.html']
+    assert new_manifest['hashes'] == dict(manifest['hashes'],
+                                          **{'index.html': 'hash'})
@@ -0,0 +1,109 @@
+import json
+import resource
+
+from pythoncz.cli import report
+
+
+def test_measure():
+    with report.measure() as stats:
+        sum(range(100000))
+
+    assert sorted(stats) == ['cpu_time', 'peak_rss', 'wall_time']
+    assert stats['wall_time'] > 0
+    assert stats['cpu_time'] >= 0
+    assert stats['peak_rss'] > 2 ** 20
+
+
+def test_measure_without_peak_rss():
+    with report.measure(peak_rss=False) as stats:
+        sum(range(100000))
+
+    assert sorted(stats) == ['cpu_time', 'wall_time']
+
+
+def test_measure_exception():
+    try:
+        with report.measure() as stats:
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert 'wall_time' in stats
+
+
+def test_rusage_to_stats():
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    stats = report.rusage_to_stats(1.5, rusage)
+
+    assert stats == {
+        'wall_time': 1.5,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'peak_rss': rusage.ru_maxrss * report.MAXRSS_UNIT,
+    }
+
+
+def test_write_report(tmp_path):
+    report_path = tmp_path / '.cache' / 'build_report.json'
+    report.write_report(report_path, {'urls': {'/': {'wall_time': 1}}})
+
+    assert json.loads(report_path.read_text()) == {
+        'urls': {'/': {'wall_time': 1}},
+    }
+
+
+def test_write_report_merges_previous_report(tmp_path):
+    report_path = tmp_path / '.cache' / 'build_report.json'
+    report.write_report(report_path, {
+        'stages': {'pages': {'wall_time': 10}, 'freeze': {'wall_time': 2}},
+        'builders': {'articles': {'wall_time': 3}, 'jobs': {'wall_time': 7}},
+        'urls': {'/': {'wall_time': 1}},
+    })
+    merged_report = report.write_report(report_path, {
+        'builders': {'articles': {'wall_time': 4}},
+    })
+
+    assert merged_report == {
+        'stages': {'pages': {'wall_time': 10}, 'freeze': {'wall_time': 2}},
+        'builders': {'articles': {'wall_time': 4}, 'jobs': {'wall_time': 7}},
+        'urls': {'/': {'wall_time': 1}},
+    }
+    assert json.loads(report_path.read_text()) == merged_report
+
+
+def stats(wall_time):
+    return {'wall_time': wall_time, 'cpu_time': 0.5, 'peak_rss': 2 ** 21}
+
+
+def test_format_summary():
+    summary = report.format_summary({
+        'stages': {'pages': stats(10), 'freeze': stats(2)},
+        'builders': {'events': stats(3), 'articles': stats(7)},
+        'urls': {f'/articles/{i}/': stats(i / 10) for i in range(10)},
+    }, limit=2)
+
+    assert summary.splitlines() == [
+        'Stages:',
+        '    10.00s wall    0.50s CPU     2.0 MiB  pages',
+        '     2.00s wall    0.50s CPU     2.0 MiB  freeze',
+        'Page builders:',
+        '     7.00s wall    0.50s CPU     2.0 MiB  articles',
+        '     3.00s wall    0.50s CPU     2.0 MiB  events',
+        'Slowest web pages:',
+        '     0.90s wall    0.50s CPU     2.0 MiB  /articles/9/',
+        '     0.80s wall    0.50s CPU     2.0 MiB  /articles/8/',
+    ]
+
+
+def test_format_summary_without_peak_rss():
+    summary = report.format_summary({
+        'urls': {'/': {'wall_time': 0.5, 'cpu_time': 0.25}},
+    })
+
+    assert summary.splitlines() == [
+        'Slowest web pages:',
+        '     0.50s wall    0.25s CPU  /',
+    ]
+
+
+def test_format_summary_empty():
+    assert report.format_summary({'stages': {}, 'builders': {}}) == ''
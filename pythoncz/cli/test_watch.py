@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from pythoncz.cli import watch
+
+
+@pytest.fixture
+def pages_path(tmp_path):
+    for name in ('articles', 'events'):
+        (tmp_path / name / 'tests').mkdir(parents=True)
+        (tmp_path / name / '__init__.py').write_text('')
+        (tmp_path / name / '__main__.py').write_text('')
+        (tmp_path / name / 'views.py').write_text('')
+        (tmp_path / name / 'config.yml').write_text('')
+        (tmp_path / name / 'test_lib.py').write_text('')
+        (tmp_path / name / 'tests' / 'test_lib.py').write_text('')
+        (tmp_path / name / 'articles_data.json').write_text('[]')
+    return tmp_path
+
+
+def test_get_watched_paths(pages_path):
+    assert watch.get_watched_paths(pages_path / 'articles') == [
+        pages_path / 'articles' / '__init__.py',
+        pages_path / 'articles' / '__main__.py',
+        pages_path / 'articles' / 'config.yml',
+    ]
+
+
+def test_get_snapshot(pages_path):
+    path = pages_path / 'articles' / 'config.yml'
+    snapshot = watch.get_snapshot([path, pages_path / 'missing.yml'])
+
+    assert snapshot == {path: path.stat().st_mtime_ns}
+
+
+def touch(path):
+    stat = path.stat()
+    mtime_ns = stat.st_mtime_ns + 1000000000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def watcher(pages_path):
+    built_names = []
+    build_started = threading.Event()
+    build_allowed = threading.Event()
+    build_allowed.set()
+
+    def build(name):
+        build_started.set()
+        build_allowed.wait()
+        built_names.append(name)
+
+    polls_count = 0
+    polled = threading.Condition()
+
+    def on_poll():
+        nonlocal polls_count
+        with polled:
+            polls_count += 1
+            polled.notify_all()
+
+    def wait_for_polls(count=2):
+        # The first poll could have started before the caller's changes,
+        # so by default it waits for one more to be sure they got noticed
+        with polled:
+            expected_count = polls_count + count
+            if not polled.wait_for(lambda: polls_count >= expected_count,
+                                   timeout=5):
+                raise TimeoutError()
+
+    stop = threading.Event()
+    thread = threading.Thread(target=watch.watch_pages, kwargs=dict(
+        pages_path=pages_path, names=['articles', 'events'], build=build,
+        interval=0.01, stop=stop, on_poll=on_poll,
+    ))
+    thread.start()
+    wait_for_polls(1)  # the initial snapshot
+    yield SimpleNamespace(built_names=built_names,
+                          build_started=build_started,
+                          build_allowed=build_allowed,
+                          wait_for_polls=wait_for_polls)
+    build_allowed.set()
+    stop.set()
+    thread.join()
+
+
+def test_watch_pages_builds_changed_page(pages_path, watcher):
+    touch(pages_path / 'events' / 'config.yml')
+
+    wait_for(lambda: watcher.built_names)
+    watcher.wait_for_polls()
+
+    assert watcher.built_names == ['events']
+
+
+def test_watch_pages_ignores_views_and_data(pages_path, watcher):
+    touch(pages_path / 'events' / 'views.py')
+    touch(pages_path / 'articles' / 'articles_data.json')
+    watcher.wait_for_polls()
+
+    assert not watcher.build_started.is_set()
+
+
+def test_watch_pages_builds_again_after_change_while_building(pages_path,
+                                                              watcher):
+    watcher.build_allowed.clear()
+    touch(pages_path / 'articles' / '__main__.py')
+    wait_for(watcher.build_started.is_set)
+
+    touch(pages_path / 'articles' / 'config.yml')
+    watcher.wait_for_polls()
+    touch(pages_path / 'articles' / '__init__.py')
+    watcher.wait_for_polls()
+    watcher.build_allowed.set()
+
+    wait_for(lambda: len(watcher.built_names) == 2)
+    watcher.wait_for_polls()
+
+    assert watcher.built_names == ['articles', 'articles']
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def watch_pages(pages_path, names, build, interval=1, stop=None,
+                on_poll=None):
+    """
+    Watches configuration and code of given pages and calls 'build(name)'
+    in the background when files of a page change. A page gets built only
+    once at a time. If it changes again while its builder is running, it's
+    built once more after the builder is done.
+
+    Blocks until the 'stop' event (threading.Event) is set. The optional
+    'on_poll()' gets called once the initial snapshot is taken and then
+    after every check of the files.
+    """
+    stop = stop or threading.Event()
+    snapshots = {name: get_snapshot(get_watched_paths(pages_path / name))
+                 for name in names}
+    pending_names = set()
+    running = {}
+    if on_poll:
+        on_poll()
+
+    with ThreadPoolExecutor(max_workers=len(names) or 1) as executor:
+        while not stop.wait(interval):
+            for name in names:
+                snapshot = get_snapshot(get_watched_paths(pages_path / name))
+                if snapshot != snapshots[name]:
+                    snapshots[name] = snapshot
+                    pending_names.add(name)
+
+            for name, future in list(running.items()):
+                if future.done():
+                    del running[name]
+            for name in sorted(pending_names - set(running)):
+                pending_names.remove(name)
+                running[name] = executor.submit(build, name)
+            if on_poll:
+                on_poll()
+
+
+def get_watched_paths(page_path):
+    # The views aren't watched, because they don't affect the data and
+    # the Flask reloader takes care of them
+    return sorted(
+        path for path in page_path.glob('**/*')
+        if (path.name == 'config.yml' or path.suffix == '.py')
+        and path.name != 'views.py'
+        and not path.name.startswith('test_')
+        and 'tests' not in path.relative_to(page_path).parts
+        and '__pycache__' not in path.parts
+    )
+
+
+def get_snapshot(paths):
+    snapshot = {}
+    for path in paths:
+        try:
+            snapshot[path] = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return snapshot
@@ -0,0 +1,33 @@
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+PROJECT_PATH = Path(__file__).parent.parent
+
+
+def run_import(name):
+    """
+    Imports given module in a fresh interpreter, returns names of all
+    modules it has imported and the cumulative import time in seconds
+    """
+    completed_process = subprocess.run([
+        sys.executable, '-X', 'importtime', '-c',
+        f'import sys, {name}; print(" ".join(sys.modules))',
+    ], cwd=PROJECT_PATH, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    if completed_process.returncode:
+        if 'ModuleNotFoundError' in completed_process.stderr:
+            pytest.skip(completed_process.stderr.splitlines()[-1])
+        raise RuntimeError(completed_process.stderr)
+    modules = completed_process.stdout.split()
+    last_line = completed_process.stderr.splitlines()[-1]
+    cumulative_time = int(last_line.split('|')[1]) / 1000000
+    return modules, cumulative_time
+
+
+@pytest.fixture
+def import_module():
+    return run_import
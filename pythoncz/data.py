@@ -1,10 +1,23 @@
+import os
 import re
 import json
+import mmap
+import struct
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import contextlib
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from arrow import Arrow
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 from pythoncz import log
 
 
@@ -20,12 +33,393 @@ DATETIME_RE = re.compile(r'''
 $
 ''', re.VERBOSE)
 
+# Data of a page can be saved as pretty-printed JSON, which is easy to inspect,
+# as MessagePack, which is smaller, faster to decode, and keeps datetimes
+# as binary values (see 'encode_msgpack_datetime()'), or as an SQLite
+# database, which can be queried by indexed fields (see 'query_data()')
+FORMATS = ('json', 'msgpack', 'sqlite')
+
+MSGPACK_DATETIME_EXT = 1
+MSGPACK_DATETIME_STRUCT = struct.Struct('>qIi')
+MSGPACK_DATETIME_NAIVE = -2 ** 31
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Index of a data file consists of the data file size followed by pairs of
+# start and end offsets of the individual records (see 'load_data()')
+INDEX_ITEM_STRUCT = struct.Struct('<Q')
+INDEX_RECORD_STRUCT = struct.Struct('<QQ')
+
+FIELDS_TREE_LEAF = None  # see 'to_fields_tree()'
+
+
+# Temporary files are created readable only by their owner, so before they
+# replace the data files, they get the permissions any new file would get.
+# The umask can only be read by setting it, so it's done once on import,
+# before any threads which could create files in the meantime
+UMASK = os.umask(0)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+
+
+# Parsed data files are shared by all requests of the process and reused as
+# long as the file on disk stays the same (see 'get_stat_key()'), so callers
+# must treat the data returned by 'load_data()' as read-only
+cache = {}
+cache_stats = {'hits': 0, 'misses': 0}
+cache_lock = threading.Lock()
+
+
+def save_data(data_path, data, format='json', indexes=()):
+    """
+    Saves data in given format (see 'FORMATS'). Unless the data is a dict,
+    it can be any iterable of records (e.g. a generator) and it gets encoded
+    one record at a time, so the whole data never needs to be in memory
+    at once.
 
-def save_data(data_path, data):
+    The data path always ends with '_data.json', the actual suffix of the
+    file is given by the format. If the result is the same as what's already
+    saved, the data file stays untouched. Returns whether the data file has
+    been written.
+
+    With the 'sqlite' format, 'indexes' can list fields of the records which
+    should be indexed for 'query_data()', e.g. 'begins_at' or, for nested
+    fields, 'location.country'.
+    """
     data_path = Path(data_path)
-    data_json = json.dumps(data, ensure_ascii=False, indent=2,
-                           default=encode_datetime)
-    data_path.write_text(data_json)
+    file_path = get_file_path(data_path, format)
+    if format == 'sqlite':
+        return save_sqlite_data(data_path, file_path, data, indexes)
+
+    encode = {'json': encode_data, 'msgpack': encode_msgpack_data}[format]
+    field_types = {}
+    data_hash = hashlib.sha256()
+
+    try:
+        with open_atomically(file_path) as f:
+            size, index = write_encoded_data(
+                f, encode(data, field_types), data_hash
+            )
+
+            if format == 'json':
+                datetime_fields = sorted(get_datetime_fields(field_types))
+                types = {'datetime_fields': datetime_fields}
+                types_json = json.dumps(types, indent=2).encode('utf-8')
+                data_hash.update(types_json)
+            data_hash = data_hash.hexdigest()
+
+            if file_path.exists() and data_hash == get_data_hash(data_path):
+                raise UnchangedData()
+
+            # The types and index files need to be in place before the data
+            # file changes, so anyone who sees the new data file also sees
+            # its types and index
+            if format == 'json':
+                with open_atomically(get_types_path(data_path)) as types_f:
+                    types_f.write(types_json)
+            if not isinstance(data, dict):
+                write_index(get_index_path(data_path), size, index)
+    except UnchangedData:
+        logger.info("Data in '%s' didn't change, keeping the file", file_path)
+        return False
+
+    remove_other_formats(data_path, format)
+    if isinstance(data, dict):
+        remove_file(get_index_path(data_path))
+    with open_atomically(get_hash_path(data_path)) as hash_f:
+        hash_f.write(data_hash.encode('ascii'))
+    return True
+
+
+def write_encoded_data(f, encoded_data, data_hash):
+    """
+    Writes chunks of encoded data to given file, returns the size of
+    the data and the start and end offsets of its records.
+    """
+    index = []
+    position = 0
+    for data_bytes, is_record in encoded_data:
+        if isinstance(data_bytes, str):
+            data_bytes = data_bytes.encode('utf-8')
+        data_hash.update(data_bytes)
+        f.write(data_bytes)
+        if is_record:
+            index.append((position, position + len(data_bytes)))
+        position += len(data_bytes)
+    return position, index
+
+
+def write_index(index_path, size, index):
+    with open_atomically(index_path) as f:
+        f.write(INDEX_ITEM_STRUCT.pack(size))
+        for offsets in index:
+            f.write(INDEX_RECORD_STRUCT.pack(*offsets))
+
+
+def save_sqlite_data(data_path, file_path, data, indexes):
+    field_types = {}
+    data_hash = hashlib.sha256()
+    columns = ', '.join(quote_column(index) for index in indexes)
+    columns = f', {columns}' if columns else ''
+    placeholders = ', ?' * len(indexes)
+
+    try:
+        with open_atomically(file_path) as f:
+            with contextlib.closing(sqlite3.connect(f.name)) as db:
+                db.execute('CREATE TABLE records (position INTEGER PRIMARY '
+                           f'KEY, record TEXT NOT NULL{columns})')
+                db.executemany(
+                    f'INSERT INTO records VALUES (?, ?{placeholders})',
+                    encode_sqlite_records(data, indexes, field_types,
+                                          data_hash)
+                )
+                for index in indexes:
+                    db.execute(f'CREATE INDEX {quote_column(index + "_idx")} '
+                               f'ON records ({quote_column(index)})')
+
+                meta = {
+                    'records': not isinstance(data, dict),
+                    'datetime_fields': sorted(
+                        get_datetime_fields(field_types)
+                    ),
+                    'indexes': list(indexes),
+                }
+                meta_json = json.dumps(meta, indent=2)
+                data_hash.update(meta_json.encode('utf-8'))
+                db.execute('CREATE TABLE meta (json TEXT NOT NULL)')
+                db.execute('INSERT INTO meta VALUES (?)', (meta_json,))
+                db.commit()
+
+            data_hash = data_hash.hexdigest()
+            if file_path.exists() and data_hash == get_data_hash(data_path):
+                raise UnchangedData()
+    except UnchangedData:
+        logger.info("Data in '%s' didn't change, keeping the file", file_path)
+        return False
+
+    remove_other_formats(data_path, 'sqlite')
+    remove_file(get_index_path(data_path))
+    with open_atomically(get_hash_path(data_path)) as hash_f:
+        hash_f.write(data_hash.encode('ascii'))
+    return True
+
+
+def encode_sqlite_records(data, indexes, field_types, data_hash):
+    records = [data] if isinstance(data, dict) else data
+    for position, record in enumerate(records):
+        update_field_types(field_types, record)
+        record_json = encode_json(record)
+        data_hash.update(record_json.encode('utf-8'))
+        values = [to_column_value(get_field(record, index))
+                  for index in indexes]
+        yield (position, record_json, *values)
+
+
+def get_field(record, field):
+    for key in field.split('.'):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def to_column_value(value):
+    # Datetimes become UTC timestamps, so they sort and compare correctly
+    # regardless of their UTC offsets
+    if isinstance(value, Arrow):
+        value = value.datetime
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (dict, list)):
+        return encode_json(value)
+    return value
+
+
+def quote_column(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_file_path(data_path, format):
+    if format not in FORMATS:
+        raise ValueError(f"Unknown data format '{format}'")
+    if format == 'msgpack' and msgpack is None:
+        raise RuntimeError("Saving data as MessagePack requires "
+                           "the 'msgpack' package to be installed")
+    return data_path.with_suffix(f'.{format}')
+
+
+def remove_other_formats(data_path, format):
+    paths = [data_path.with_suffix(f'.{other_format}')
+             for other_format in FORMATS if other_format != format]
+    if format != 'json':
+        paths.append(get_types_path(data_path))
+    for path in paths:
+        remove_file(path)
+
+
+def remove_file(path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def remove_data(data_path):
+    """
+    Removes data saved by 'save_data()', in whichever format it is, together
+    with all the files saved next to it.
+    """
+    data_path = Path(data_path)
+    # Without the hash, the data is considered missing even if removing
+    # the other files gets interrupted
+    remove_file(get_hash_path(data_path))
+    for format in FORMATS:
+        remove_file(data_path.with_suffix(f'.{format}'))
+    remove_file(get_types_path(data_path))
+    remove_file(get_index_path(data_path))
+
+
+class UnchangedData(Exception):
+    pass
+
+
+def depends_on(*data_paths, daily=False):
+    """
+    Decorator declaring which data files the view renders. The web build
+    then renders the view's pages again only if some of the files, or the
+    code, templates and static files of the website have changed. Views
+    without the declaration get always rendered. Views which filter the data
+    by the current date should be marked as 'daily'.
+    """
+    def decorator(view):
+        view.data_paths = [Path(data_path) for data_path in data_paths]
+        view.daily = daily
+        return view
+    return decorator
+
+
+def get_data_hash(data_path):
+    try:
+        return get_hash_path(Path(data_path)).read_text()
+    except FileNotFoundError:
+        return None
+
+
+def get_hash_path(data_path):
+    return data_path.with_suffix('.sha256')
+
+
+def get_index_path(data_path):
+    return data_path.with_suffix('.index')
+
+
+@contextlib.contextmanager
+def open_atomically(path):
+    f = tempfile.NamedTemporaryFile('wb', dir=path.parent,
+                                    prefix=f'{path.name}.', suffix='.tmp',
+                                    delete=False)
+    try:
+        with f:
+            yield f
+            os.fchmod(f.fileno(), FILE_MODE)
+        os.replace(f.name, path)
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+
+def encode_data(data, field_types):
+    # Produces the same output as json.dumps(list(data), indent=2) would
+    if isinstance(data, dict):
+        update_field_types(field_types, data)
+        yield encode_json(data), False
+        return
+
+    separator = '[\n  '
+    for record in data:
+        update_field_types(field_types, record)
+        yield separator, False
+        yield encode_json(record).replace('\n', '\n  '), True
+        separator = ',\n  '
+    yield ('[]' if separator == '[\n  ' else '\n]'), False
+
+
+def encode_json(o):
+    return json.dumps(o, ensure_ascii=False, indent=2,
+                      default=encode_datetime)
+
+
+def encode_msgpack_data(data, field_types):
+    # The file is a stream of MessagePack objects, so records can be written
+    # one by one without knowing their count upfront. The first object tells
+    # whether the rest are records of a list, or a single dict.
+    packer = msgpack.Packer(default=encode_msgpack_datetime,
+                            use_bin_type=True)
+    if isinstance(data, dict):
+        yield packer.pack({'records': False}), False
+        yield packer.pack(data), False
+    else:
+        yield packer.pack({'records': True}), False
+        for record in data:
+            yield packer.pack(record), True
+
+
+def encode_msgpack_datetime(o):
+    if isinstance(o, Arrow):
+        o = o.datetime
+    if not isinstance(o, datetime):
+        raise TypeError(f'Object of type {o.__class__.__name__} '
+                        + 'is not MessagePack serializable')
+
+    offset = o.utcoffset()
+    if offset is None:
+        delta = o.replace(tzinfo=timezone.utc) - EPOCH
+        offset_seconds = MSGPACK_DATETIME_NAIVE
+    else:
+        delta = o - EPOCH
+        offset_seconds = int(offset.total_seconds())
+
+    seconds = delta.days * 86400 + delta.seconds
+    value = MSGPACK_DATETIME_STRUCT.pack(seconds, delta.microseconds,
+                                         offset_seconds)
+    return msgpack.ExtType(MSGPACK_DATETIME_EXT, value)
+
+
+def decode_msgpack_ext(code, value):
+    if code != MSGPACK_DATETIME_EXT:
+        return msgpack.ExtType(code, value)
+
+    seconds, microseconds, offset_seconds = \
+        MSGPACK_DATETIME_STRUCT.unpack(value)
+    dt = EPOCH + timedelta(seconds=seconds, microseconds=microseconds)
+    if offset_seconds == MSGPACK_DATETIME_NAIVE:
+        return dt.replace(tzinfo=None)
+    return dt.astimezone(timezone(timedelta(seconds=offset_seconds)))
+
+
+def get_types_path(data_path):
+    return data_path.with_suffix('.types.json')
+
+
+def update_field_types(field_types, o, field=()):
+    # For each field of the data, 'field_types' tells whether all values
+    # found at it so far have been datetimes. Nulls and empty lists don't
+    # tell anything about the type, so they're skipped.
+    if isinstance(o, dict):
+        for key, value in o.items():
+            update_field_types(field_types, value, field + (key,))
+    elif isinstance(o, (list, tuple)):
+        for item in o:
+            update_field_types(field_types, item, field)
+    elif o is not None:
+        is_datetime = isinstance(o, (Arrow, datetime))
+        field_types[field] = field_types.get(field, True) and is_datetime
+
+
+def get_datetime_fields(field_types):
+    return {field for field, is_datetime in field_types.items()
+            if is_datetime}
 
 
 def encode_datetime(o):
@@ -35,7 +429,13 @@ def encode_datetime(o):
                     + 'is not JSON serializable')
 
 
-def load_data(data_path, default=None, debug=False):
+def load_data(data_path, default=None, debug=False, records=None):
+    """
+    Loads data saved by 'save_data()'. If the data is a list, 'records' can
+    be a slice to get only some of the records, e.g. 'slice(10)' for
+    the first ten. Thanks to the index saved next to the data file, only
+    those records get read and decoded.
+    """
     data_path = Path(data_path)
     assert data_path.match('*_data.json')
 
@@ -44,7 +444,8 @@ def load_data(data_path, default=None, debug=False):
     assert package_path.parts[-2] == 'pages'
 
     try:
-        data_json = data_path.read_text()
+        file_path = find_file_path(data_path)
+        stat_key = get_stat_key(file_path)
     except FileNotFoundError:
         if debug:
             build_command = f'pipenv run build {package_path.parts[-1]}'
@@ -56,8 +457,274 @@ def load_data(data_path, default=None, debug=False):
             return default
         else:
             raise
+
+    if records is None:
+        cache_key = data_path
+    else:
+        cache_key = (data_path, records.start, records.stop, records.step)
+
+    with cache_lock:
+        cached = cache.get(cache_key)
+        if cached and cached[0] == stat_key:
+            cache_stats['hits'] += 1
+            return cached[1]
+        cache_stats['misses'] += 1
+
+    if records is None:
+        data = parse_data(data_path, file_path)
+    else:
+        data = parse_records(data_path, file_path, records)
+    with cache_lock:
+        cache[cache_key] = (stat_key, data)
+    return data
+
+
+def find_file_path(data_path):
+    # If there are files in several formats (e.g. the builder has just
+    # switched formats), the most recently written one is the right one
+    file_paths = []
+    for format in FORMATS:
+        file_path = data_path.with_suffix(f'.{format}')
+        try:
+            file_paths.append((file_path.stat().st_mtime_ns, file_path))
+        except FileNotFoundError:
+            pass
+    if not file_paths:
+        raise FileNotFoundError(f"No data file for '{data_path}'")
+    return max(file_paths)[1]
+
+
+def parse_data(data_path, file_path):
+    if file_path.suffix == '.msgpack':
+        return parse_msgpack_data(file_path)
+    if file_path.suffix == '.sqlite':
+        return parse_sqlite_data(file_path)
+    parse_json = get_json_parser(data_path)
+    return parse_json(file_path.read_bytes())
+
+
+def parse_records(data_path, file_path, records):
+    if file_path.suffix == '.sqlite':
+        return parse_sqlite_records(file_path, records)
+
+    index_path = get_index_path(data_path)
+    try:
+        with index_path.open('rb') as index_f:
+            index = read_index(index_f, file_path.stat().st_size, records)
+    except FileNotFoundError:
+        index = None
+    if index is None:
+        logger.warning("Index '%s' is missing or outdated", index_path)
+        return parse_data(data_path, file_path)[records]
+    if not index:
+        return []
+
+    if file_path.suffix == '.msgpack':
+        decode_record = parse_msgpack_record
     else:
-        return json.loads(data_json, object_hook=decode_datetime)
+        decode_record = get_json_parser(data_path)
+
+    with file_path.open('rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data_m:
+            return [decode_record(data_m[start:end]) for start, end in index]
+
+
+def read_index(index_f, file_size, records):
+    data_size, = INDEX_ITEM_STRUCT.unpack(
+        index_f.read(INDEX_ITEM_STRUCT.size)
+    )
+    if data_size != file_size:
+        return None
+
+    index_f.seek(0, os.SEEK_END)
+    index_size = index_f.tell() - INDEX_ITEM_STRUCT.size
+    count = index_size // INDEX_RECORD_STRUCT.size
+
+    start, stop, step = to_range(records, count)
+    if start >= stop:
+        return []
+
+    index_f.seek(INDEX_ITEM_STRUCT.size + start * INDEX_RECORD_STRUCT.size)
+    index_bytes = index_f.read((stop - start) * INDEX_RECORD_STRUCT.size)
+    return apply_step(list(INDEX_RECORD_STRUCT.iter_unpack(index_bytes)), step)
+
+
+def to_range(records, count):
+    # Turns a slice into a range of consecutive items, which can be read
+    # at once, and a step to apply on them afterwards (see 'apply_step()')
+    start, stop, step = records.indices(count)
+    if step < 0:
+        start, stop = stop + 1, start + 1
+    return start, max(start, stop), step
+
+
+def apply_step(items, step):
+    return items[::step] if step > 0 else items[::-1][::-step]
+
+
+def get_json_parser(data_path):
+    try:
+        types = json.loads(get_types_path(data_path).read_text())
+    except FileNotFoundError:
+        # Data file saved before types files were introduced
+        return to_json_parser(None)
+    else:
+        return to_json_parser(types['datetime_fields'])
+
+
+def to_json_parser(datetime_fields):
+    if datetime_fields is None:
+        return lambda data_bytes: json.loads(data_bytes,
+                                             object_hook=decode_datetime)
+    fields_tree = to_fields_tree(datetime_fields)
+    return lambda data_bytes: decode_datetime_fields(json.loads(data_bytes),
+                                                     fields_tree)
+
+
+def parse_sqlite_data(file_path):
+    with connect_sqlite(file_path) as (db, meta):
+        parse_json = to_json_parser(meta['datetime_fields'])
+        cursor = db.execute('SELECT record FROM records ORDER BY position')
+        records = [parse_json(record) for record, in cursor]
+    return records if meta['records'] else records[0]
+
+
+def parse_sqlite_records(file_path, records):
+    with connect_sqlite(file_path) as (db, meta):
+        if not meta['records']:
+            raise TypeError('Data is not a list of records')
+        parse_json = to_json_parser(meta['datetime_fields'])
+        count, = db.execute('SELECT count(*) FROM records').fetchone()
+        start, stop, step = to_range(records, count)
+        cursor = db.execute('SELECT record FROM records WHERE position >= ? '
+                            'AND position < ? ORDER BY position',
+                            (start, stop))
+        return apply_step([parse_json(record) for record, in cursor], step)
+
+
+@contextlib.contextmanager
+def connect_sqlite(file_path):
+    uri = f'{file_path.resolve().as_uri()}?mode=ro'
+    with contextlib.closing(sqlite3.connect(uri, uri=True)) as db:
+        meta_json, = db.execute('SELECT json FROM meta').fetchone()
+        yield db, json.loads(meta_json)
+
+
+def query_data(data_path, field, since=None, until=None, descending=False,
+               limit=None, default=None, debug=False):
+    """
+    Returns records with given field between 'since' and 'until' (both
+    inclusive and optional), ordered by the field. If the data is saved
+    in the 'sqlite' format and the field is indexed, the database does all
+    the work. Otherwise all records get loaded and filtered in Python.
+    """
+    data_path = Path(data_path)
+    try:
+        file_path = find_file_path(data_path)
+    except FileNotFoundError:
+        if debug:
+            return load_data(data_path, default=default, debug=debug)
+        raise
+
+    if file_path.suffix == '.sqlite':
+        with connect_sqlite(file_path) as (db, meta):
+            if meta['records'] and field in meta['indexes']:
+                return query_sqlite_data(db, meta, field, since, until,
+                                         descending, limit)
+
+    # Values get compared the same way the database compares them
+    since = to_column_value(since)
+    until = to_column_value(until)
+    records = []
+    for record in load_data(data_path):
+        value = to_column_value(get_field(record, field))
+        if (value is not None
+                and (since is None or since <= value)
+                and (until is None or value <= until)):
+            records.append((value, record))
+    records.sort(key=lambda item: item[0], reverse=descending)
+    records = [record for value, record in records]
+    return records if limit is None else records[:limit]
+
+
+def query_sqlite_data(db, meta, field, since, until, descending, limit):
+    column = quote_column(field)
+    conditions = [f'{column} IS NOT NULL']
+    params = []
+    if since is not None:
+        conditions.append(f'{column} >= ?')
+        params.append(to_column_value(since))
+    if until is not None:
+        conditions.append(f'{column} <= ?')
+        params.append(to_column_value(until))
+    order = 'DESC' if descending else 'ASC'
+
+    cursor = db.execute(f'SELECT record FROM records '
+                        f'WHERE {" AND ".join(conditions)} '
+                        f'ORDER BY {column} {order}, position '
+                        f'LIMIT ?', (*params, -1 if limit is None else limit))
+    parse_json = to_json_parser(meta['datetime_fields'])
+    return [parse_json(record) for record, in cursor]
+
+
+def parse_msgpack_record(record_bytes):
+    return msgpack.unpackb(record_bytes, ext_hook=decode_msgpack_ext,
+                           raw=False)
+
+
+def parse_msgpack_data(file_path):
+    if msgpack is None:
+        raise RuntimeError(f"Loading data from '{file_path}' requires "
+                           "the 'msgpack' package to be installed")
+    with file_path.open('rb') as f:
+        unpacker = msgpack.Unpacker(f, ext_hook=decode_msgpack_ext,
+                                    raw=False)
+        header = next(unpacker)
+        if header['records']:
+            return list(unpacker)
+        return next(unpacker)
+
+
+def to_fields_tree(fields):
+    # A field can hold a datetime in some records and nested fields with
+    # datetimes in others, so its node marks itself as a datetime field by
+    # the FIELDS_TREE_LEAF key, which can't clash with keys of JSON objects
+    tree = {}
+    for field in fields:
+        node = tree
+        for key in field:
+            node = node.setdefault(key, {})
+        node[FIELDS_TREE_LEAF] = True
+    return tree
+
+
+def decode_datetime_fields(o, fields_tree):
+    if isinstance(o, list):
+        return [decode_datetime_fields(item, fields_tree) for item in o]
+    if isinstance(o, dict):
+        for key, subtree in fields_tree.items():
+            if key in o:
+                o[key] = decode_datetime_fields(o[key], subtree)
+        return o
+    if isinstance(o, str) and FIELDS_TREE_LEAF in fields_tree:
+        return datetime.fromisoformat(o)
+    return o
+
+
+def get_stat_key(file_path):
+    stat = file_path.stat()
+    return (file_path, stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def cache_info():
+    with cache_lock:
+        return dict(cache_stats, size=len(cache))
+
+
+def clear_cache():
+    with cache_lock:
+        cache.clear()
+        cache_stats.update(hits=0, misses=0)
 
 
 def decode_datetime(o):
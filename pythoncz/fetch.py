@@ -0,0 +1,172 @@
+import json
+import hashlib
+import threading
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pythoncz import log
+from pythoncz.data import open_atomically
+
+
+logger = log.get(__name__)
+
+
+MAX_WORKERS = 8
+TIMEOUT = (10, 60)  # seconds to connect, seconds to wait for data
+
+HTTP_CACHE_PATH = Path(__file__).parent.parent / '.cache' / 'http'
+
+
+class FetchError(RuntimeError):
+    """
+    Raised when a URL can't be downloaded. The 'status_code' is None unless
+    the server responded with an HTTP error status.
+    """
+
+    def __init__(self, url, status_code=None):
+        self.url = url
+        self.status_code = status_code
+        super().__init__(f'Could not get {url}')
+
+
+# All downloads of the process share one session, which keeps a pool of
+# connections, so requests to the same host reuse them
+session = None
+session_lock = threading.Lock()
+
+
+def get_session():
+    global session
+    with session_lock:
+        if session is None:
+            session = create_session()
+    return session
+
+
+def create_session():
+    new_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS,
+                          pool_maxsize=MAX_WORKERS)
+    new_session.mount('http://', adapter)
+    new_session.mount('https://', adapter)
+    return new_session
+
+
+def fetch(url, timeout=TIMEOUT, headers=None):
+    logger.info(f'Downloading {url}')
+    try:
+        response = get_session().get(url, timeout=timeout, headers=headers)
+        response.raise_for_status()
+    except requests.HTTPError as http_exc:
+        raise FetchError(url, http_exc.response.status_code) from http_exc
+    except Exception as request_exc:
+        raise FetchError(url) from request_exc
+    return response
+
+
+def fetch_bytes(url, timeout=TIMEOUT, cache_path=None):
+    content, encoding = fetch_content(url, timeout, cache_path)
+    return content
+
+
+def fetch_text(url, timeout=TIMEOUT, cache_path=None):
+    content, encoding = fetch_content(url, timeout, cache_path)
+    return str(content, encoding, errors='replace')
+
+
+def fetch_content(url, timeout=TIMEOUT, cache_path=None):
+    """
+    Downloads given URL and returns its content and its text encoding.
+
+    With 'cache_path', responses carrying an ETag or Last-Modified header
+    get cached in that directory. The next time the server is asked whether
+    the content changed since, and if it responds with '304 Not Modified',
+    the cached content is returned.
+    """
+    if not cache_path:
+        response = fetch(url, timeout)
+        return response.content, get_encoding(response)
+
+    cached = read_cached_response(cache_path, url)
+    response = fetch(url, timeout, headers=get_validators_headers(cached))
+    if response.status_code == 304 and cached:
+        logger.info(f'Not modified {url}')
+        return cached['content'], cached['encoding']
+
+    content, encoding = response.content, get_encoding(response)
+    write_cached_response(cache_path, url, response.headers, content,
+                          encoding)
+    return content, encoding
+
+
+def get_encoding(response):
+    # The same fallback requests use for the 'text' attribute
+    return response.encoding or response.apparent_encoding or 'utf-8'
+
+
+def get_validators_headers(cached):
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    return headers
+
+
+def get_cache_paths(cache_path, url):
+    name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return cache_path / f'{name}.json', cache_path / f'{name}.body'
+
+
+def read_cached_response(cache_path, url):
+    meta_path, content_path = get_cache_paths(cache_path, url)
+    try:
+        cached = json.loads(meta_path.read_text())
+        cached['content'] = content_path.read_bytes()
+    except (FileNotFoundError, ValueError):
+        return None
+    return cached if cached.get('url') == url else None
+
+
+def write_cached_response(cache_path, url, headers, content, encoding):
+    meta_path, content_path = get_cache_paths(cache_path, url)
+    # The metadata go away first, so if writing the content fails, there
+    # are no validators pointing to a content of a different response
+    for path in (meta_path, content_path):
+        if path.exists():
+            path.unlink()
+
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if not etag and not last_modified:
+        return
+
+    cache_path.mkdir(parents=True, exist_ok=True)
+    with open_atomically(content_path) as f:
+        f.write(content)
+    meta = dict(url=url, etag=etag, last_modified=last_modified,
+                encoding=encoding)
+    with open_atomically(meta_path) as f:
+        f.write(json.dumps(meta).encode('utf-8'))
+
+
+def fetch_all(urls, fetch=fetch_bytes, max_workers=MAX_WORKERS, **kwargs):
+    """
+    Downloads given URLs, at most 'max_workers' of them at once, and yields
+    results of 'fetch(url, **kwargs)' in the same order as the URLs.
+    """
+    return map_concurrently(partial(fetch, **kwargs), urls,
+                            max_workers=max_workers)
+
+
+def map_concurrently(function, items, max_workers=MAX_WORKERS):
+    """
+    Like map(), but calls the function on a pool of threads, so functions
+    which spend most of the time downloading can run at the same time.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(function, items)
@@ -1,14 +1,46 @@
+import io
+import time
+import heapq
 import itertools
-import operator
-from time import mktime
+import email.utils
+from types import SimpleNamespace
 from datetime import datetime
+from urllib.parse import urlparse
 
 import arrow
 import feedparser
+from lxml import etree
+
+
+ARTICLES_PER_PAGE = 10
+# How many pages around the current one the pagination links to, so
+# the size of each archive page doesn't grow with the archive
+PAGINATION_WINDOW = 2
+ARCHIVE_DATA_NAME = 'articles_archive_data.json'
 
 
 def sort_articles(articles):
-    return sorted(articles, key=operator.itemgetter('date'), reverse=True)
+    return sorted(articles, key=get_article_epoch, reverse=True)
+
+
+def get_newest_articles(articles_streams, limit=None):
+    """
+    Merges streams of articles, each already sorted from the newest, into
+    a single stream sorted from the newest, which stops after 'limit'
+    articles. Only the first article of each stream is held in a heap, so
+    getting the newest N out of K streams doesn't need to sort them all.
+    """
+    articles = heapq.merge(*articles_streams, key=get_article_epoch,
+                           reverse=True)
+    return itertools.islice(articles, limit)
+
+
+def get_article_epoch(article):
+    # Integers compare much faster than Arrow objects
+    date = article['date']
+    if isinstance(date, datetime):
+        return int(date.timestamp())
+    return date.timestamp
 
 
 def get_articles_from_feeds(feeds_rss_entries):
@@ -18,18 +50,61 @@ def get_articles_from_feeds(feeds_rss_entries):
     )
 
 
+def merge_articles(articles, feeds_rss_entries, config_articles):
+    """
+    Merges articles from feeds and from the config into 'articles', which
+    are the previously built articles, sorted from the newest.
+
+    Previous articles are identified by their URL and RSS entries of them
+    don't get converted again. They're kept even if they're not in the feed
+    anymore, so the archive grows over time. Only articles of feeds which
+    aren't configured anymore get dropped. Articles from the config always
+    get replaced by their current version.
+    """
+    feeds_rss_entries = list(feeds_rss_entries)
+    feeds = {feed['rss_url']: feed for feed, rss_entries in feeds_rss_entries}
+
+    known_articles = [
+        dict(article, date=arrow.get(article['date']),
+             feed=rss_feed_to_article_feed(feeds[article['feed']['rss_url']]))
+        for article in articles
+        if article.get('feed') and article['feed']['rss_url'] in feeds
+    ]
+    known_urls = {article['url'] for article in known_articles}
+
+    # Feeds usually list entries from the newest, so sorting each of them
+    # separately is cheap and they can be merged afterwards
+    articles_streams = [known_articles]
+    for feed, rss_entries in feeds_rss_entries:
+        new_articles = []
+        for rss_entry in rss_entries:
+            if rss_entry.link not in known_urls:
+                known_urls.add(rss_entry.link)
+                new_articles.append(rss_entry_to_article(feed, rss_entry))
+        articles_streams.append(sort_articles(new_articles))
+    articles_streams.append(sort_articles(
+        map(config_article_to_article, config_articles)
+    ))
+
+    return list(get_newest_articles(articles_streams))
+
+
 def rss_entry_to_article(feed, rss_entry):
     return {
         'title': rss_entry.title,
         'date': arrow.get(
-            datetime.fromtimestamp(mktime(rss_entry.published_parsed))
+            datetime.fromtimestamp(time.mktime(rss_entry.published_parsed))
         ),
         'url': rss_entry.link,
-        'feed': {
-            'title': feed['title'],
-            'url': feed['url'],
-            'rss_url': feed['rss_url'],
-        }
+        'feed': rss_feed_to_article_feed(feed),
+    }
+
+
+def rss_feed_to_article_feed(feed):
+    return {
+        'title': feed['title'],
+        'url': feed['url'],
+        'rss_url': feed['rss_url'],
     }
 
 
@@ -41,5 +116,130 @@ def config_article_to_article(config_article):
     }
 
 
-def rss_entries_from_bytes(rss_bytes):
-    return feedparser.parse(rss_bytes).entries
+def get_archive(articles, feeds, per_page=ARTICLES_PER_PAGE):
+    """
+    Splits articles, sorted from the newest, into pages of the archive and
+    pages of listings of the individual feeds. Returns the archive index,
+    which tells how many pages there are, and a dict of the pages keyed by
+    names of their data files (see 'get_archive_page_name()').
+    """
+    articles = list(articles)
+    feeds_articles = {feed['rss_url']: [] for feed in feeds}
+    for article in articles:
+        if article.get('feed'):
+            feeds_articles[article['feed']['rss_url']].append(article)
+
+    archive = {'pages_count': 0, 'feeds': []}
+    archive_pages = {}
+    listings = [(None, articles)]
+    listings.extend((feed, feeds_articles[feed['rss_url']]) for feed in feeds)
+    for feed, listing_articles in listings:
+        pages = paginate(listing_articles, per_page)
+        for number, page_articles in enumerate(pages, 1):
+            name = get_archive_page_name(
+                number, feed['slug'] if feed else None
+            )
+            archive_pages[name] = {'number': number,
+                                   'pages_count': len(pages),
+                                   'articles': page_articles}
+        if feed:
+            archive['feeds'].append({'slug': feed['slug'],
+                                     'title': feed['title'],
+                                     'url': feed['url'],
+                                     'pages_count': len(pages)})
+        else:
+            archive['pages_count'] = len(pages)
+    return archive, archive_pages
+
+
+def get_archive_page_name(number, feed_slug=None):
+    if feed_slug:
+        return f'articles_feed_{feed_slug}_page_{number}_data.json'
+    return f'articles_page_{number}_data.json'
+
+
+def paginate(items, per_page):
+    # Even an empty listing has its first page
+    return [items[i:i + per_page]
+            for i in range(0, len(items), per_page)] or [[]]
+
+
+def get_page_numbers(number, pages_count, window=PAGINATION_WINDOW):
+    """
+    Returns numbers of pages the pagination of given page links to: the first
+    and the last one and those around the current one. Gaps between them
+    are marked by None.
+    """
+    numbers = sorted({1, pages_count} | set(range(
+        max(number - window, 1), min(number + window, pages_count) + 1
+    )))
+    page_numbers = []
+    for page_number in numbers:
+        if page_numbers and page_number - page_numbers[-1] > 1:
+            page_numbers.append(None)
+        page_numbers.append(page_number)
+    return page_numbers
+
+
+def rss_entries_from_bytes(rss_bytes, limit=None):
+    """
+    Returns entries of given RSS or Atom feed, at most 'limit' of them.
+
+    Only title, link and publication date of the entries get extracted, by
+    a streaming parser which stops after reading enough entries. Feeds it
+    can't fully understand get parsed by feedparser instead.
+    """
+    try:
+        return list(itertools.islice(parse_rss_entries(rss_bytes), limit))
+    except (etree.LxmlError, ValueError, arrow.parser.ParserError):
+        return feedparser.parse(rss_bytes).entries[:limit]
+
+
+def parse_rss_entries(rss_bytes):
+    elements = etree.iterparse(io.BytesIO(rss_bytes),
+                               tag=('{*}item', '{*}entry'),
+                               resolve_entities=False)
+    for event, element in elements:
+        yield element_to_rss_entry(element)
+
+        # Entries which have been read aren't needed anymore
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def element_to_rss_entry(element):
+    title = link = published_parsed = None
+    for child in element.iterchildren(tag=etree.Element):
+        name = etree.QName(child).localname
+        if name == 'title' and title is None:
+            title = ''.join(child.itertext()).strip()
+        elif name == 'link' and link is None:
+            if child.get('href'):  # Atom
+                if child.get('rel', 'alternate') == 'alternate':
+                    link = child.get('href').strip()
+            else:
+                link = (child.text or '').strip()
+        elif name == 'pubDate' and published_parsed is None:
+            published_parsed = parse_rfc822_date(child.text or '')
+        elif name in ('published', 'date') and published_parsed is None:
+            published_parsed = parse_iso_date(child.text or '')
+
+    if not title or published_parsed is None:
+        raise ValueError('Entry without a title or a publication date')
+    # Relative links would need to be resolved, which feedparser can do
+    if not link or urlparse(link).scheme not in ('http', 'https'):
+        raise ValueError(f'Entry without an absolute link: {link!r}')
+    return SimpleNamespace(title=title, link=link,
+                           published_parsed=published_parsed)
+
+
+def parse_rfc822_date(text):
+    parsed = email.utils.parsedate_tz(text)
+    if not parsed:
+        raise ValueError(f'Invalid date: {text!r}')
+    return time.gmtime(email.utils.mktime_tz(parsed))
+
+
+def parse_iso_date(text):
+    return time.gmtime(arrow.get(text.strip()).timestamp)
@@ -1,36 +1,47 @@
-import itertools
 from pathlib import Path
 
-import requests
 import yaml
 
-from pythoncz.data import save_data
-from pythoncz.pages.articles import (sort_articles, get_articles_from_feeds,
-                                     rss_entries_from_bytes,
-                                     config_article_to_article)
+from pythoncz.fetch import HTTP_CACHE_PATH, fetch_all
+from pythoncz.data import load_data, save_data, remove_data
+from pythoncz.pages.articles import (ARCHIVE_DATA_NAME, get_archive,
+                                     merge_articles, rss_entries_from_bytes)
 
 
-def download_rss_as_bytes(rss_url):
+def build(package_path=Path(__file__).parent):
+    config_path = package_path / 'config.yml'
+    config = yaml.safe_load(config_path.read_text())
+
+    feeds = config['feeds']
+    feeds_bytes = fetch_all((feed['rss_url'] for feed in feeds),
+                            cache_path=HTTP_CACHE_PATH)
+    feeds_rss_entries = (
+        (feed, rss_entries_from_bytes(rss_bytes))
+        for feed, rss_bytes in zip(feeds, feeds_bytes)
+    )
+
+    # Articles which aren't in their feeds anymore are kept from the data
+    # of the previous build, so the data file is an archive
+    data_path = package_path / 'articles_data.json'
     try:
-        response = requests.get(rss_url)
-        response.raise_for_status()
-        return response.content
-    except Exception as request_exc:
-        exc = RuntimeError(f'Could not get RSS/Atom feed from {rss_url}')
-        raise exc from request_exc
-
-
-config_path = Path(__file__).parent / 'config.yml'
-config = yaml.safe_load(config_path.read_text())
-
-articles_from_feeds = get_articles_from_feeds(
-    (feed, rss_entries_from_bytes(download_rss_as_bytes(feed['rss_url'])))
-    for feed in config['feeds']
-)
-articles = sort_articles(itertools.chain(
-    articles_from_feeds,
-    map(config_article_to_article, config['articles']),
-))
-
-data_path = Path(__file__).parent / 'articles_data.json'
-save_data(data_path, list(articles))
+        previous_articles = load_data(data_path)
+    except FileNotFoundError:
+        previous_articles = []
+    articles = merge_articles(previous_articles, feeds_rss_entries,
+                              config['articles'])
+    save_data(data_path, articles)
+
+    # Each page of the archive gets a small data file of its own, so views
+    # don't need to load the whole archive to render a single page
+    archive, archive_pages = get_archive(articles, feeds)
+    for name, archive_page in archive_pages.items():
+        save_data(package_path / name, archive_page)
+    save_data(package_path / ARCHIVE_DATA_NAME, archive)
+    for hash_path in package_path.glob('articles_*page_*_data.sha256'):
+        page_data_path = hash_path.with_suffix('.json')
+        if page_data_path.name not in archive_pages:
+            remove_data(page_data_path)
+
+
+if __name__ == '__main__':
+    build()
@@ -1,11 +1,17 @@
+import re
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
+from types import SimpleNamespace
 
+import yaml
 import arrow
 import pytest
+import feedparser
 
+from pythoncz.data import load_data
 from pythoncz.pages import articles
+from pythoncz.pages.articles import __main__ as articles_main
 
 
 class Entry:
@@ -122,3 +128,367 @@ def test_rss_entries_from_bytes(rss_bytes):
     assert rss_entries[1].title == 'Title 2'
     assert rss_entries[1].published_parsed == time.gmtime(1550595600)
     assert rss_entries[1].link == 'http://example.com/2.html'
+
+
+def article(url, date, feed_=None, title='Article'):
+    article = {'title': title, 'date': arrow.get(date), 'url': url}
+    if feed_:
+        article['feed'] = articles.rss_feed_to_article_feed(feed_)
+    return article
+
+
+def entry(url, date, title='Article'):
+    return Entry(title=title, link=url,
+                 published_parsed=arrow.get(date).datetime.timetuple())
+
+
+def test_merge_articles(feed):
+    previous_articles = [
+        article('http://example.com/3', '2019-03-01', feed),
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+    feeds_rss_entries = [(feed, [
+        entry('http://example.com/4', '2019-04-01'),
+        entry('http://example.com/3', '2019-03-01', title='Changed'),
+        entry('http://example.com/2', '2019-02-01'),
+    ])]
+
+    assert articles.merge_articles(previous_articles, feeds_rss_entries,
+                                   []) == [
+        article('http://example.com/4', '2019-04-01', feed),
+        article('http://example.com/3', '2019-03-01', feed),
+        article('http://example.com/2', '2019-02-01', feed),
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+
+
+def test_merge_articles_converts_only_new_entries(feed, monkeypatch):
+    previous_articles = [article('http://example.com/1', '2019-01-01', feed)]
+    feeds_rss_entries = [(feed, [
+        entry('http://example.com/2', '2019-02-01'),
+        entry('http://example.com/1', '2019-01-01'),
+    ])]
+    converted_urls = []
+    rss_entry_to_article = articles.rss_entry_to_article
+
+    def convert(feed, rss_entry):
+        converted_urls.append(rss_entry.link)
+        return rss_entry_to_article(feed, rss_entry)
+
+    monkeypatch.setattr(articles, 'rss_entry_to_article', convert)
+    articles.merge_articles(previous_articles, feeds_rss_entries, [])
+
+    assert converted_urls == ['http://example.com/2']
+
+
+def test_merge_articles_without_previous_articles(feed):
+    feeds_rss_entries = [(feed, [
+        entry('http://example.com/1', '2019-01-01'),
+        entry('http://example.com/2', '2019-02-01'),
+    ])]
+    config_articles = [{'title': 'Article', 'date': '2019-01-15',
+                        'url': 'http://example.com/config'}]
+
+    assert articles.merge_articles([], feeds_rss_entries,
+                                   config_articles) == [
+        article('http://example.com/2', '2019-02-01', feed),
+        article('http://example.com/config', '2019-01-15'),
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+
+
+def test_merge_articles_replaces_config_articles(feed):
+    previous_articles = [
+        article('http://example.com/config', '2019-01-15', title='Old'),
+        article('http://example.com/removed', '2019-01-10'),
+    ]
+    config_articles = [{'title': 'New', 'date': '2019-01-15',
+                        'url': 'http://example.com/config'}]
+
+    assert articles.merge_articles(previous_articles, [(feed, [])],
+                                   config_articles) == [
+        article('http://example.com/config', '2019-01-15', title='New'),
+    ]
+
+
+def test_merge_articles_drops_articles_of_removed_feeds(feed):
+    removed_feed = dict(feed, rss_url='http://example.com/removed.xml')
+    previous_articles = [
+        article('http://example.com/2', '2019-02-01', removed_feed),
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+
+    assert articles.merge_articles(previous_articles, [(feed, [])], []) == [
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+
+
+def test_merge_articles_updates_feeds(feed):
+    previous_articles = [article('http://example.com/1', '2019-01-01',
+                                 dict(feed, title='Old title'))]
+
+    assert articles.merge_articles(previous_articles, [(feed, [])], []) == [
+        article('http://example.com/1', '2019-01-01', feed),
+    ]
+
+
+def test_merge_articles_loaded_dates(feed):
+    previous_articles = [{
+        'title': 'Article',
+        'date': datetime(2019, 1, 1, tzinfo=timezone.utc),
+        'url': 'http://example.com/1',
+        'feed': articles.rss_feed_to_article_feed(feed),
+    }]
+    feeds_rss_entries = [(feed, [
+        entry('http://example.com/2', '2019-02-01'),
+    ])]
+    merged_articles = articles.merge_articles(previous_articles,
+                                              feeds_rss_entries, [])
+
+    assert [type(article['date']) for article in merged_articles] == [
+        arrow.Arrow, arrow.Arrow,
+    ]
+    assert previous_articles[0]['date'] == datetime(2019, 1, 1,
+                                                    tzinfo=timezone.utc)
+
+
+def test_get_newest_articles():
+    articles_streams = [
+        [article('http://example.com/5', '2019-05-01'),
+         article('http://example.com/1', '2019-01-01')],
+        [],
+        [article('http://example.com/4', '2019-04-01'),
+         article('http://example.com/3', '2019-03-01'),
+         article('http://example.com/2', '2019-02-01')],
+    ]
+
+    assert [a['url'] for a in articles.get_newest_articles(
+        articles_streams, limit=3
+    )] == [
+        'http://example.com/5',
+        'http://example.com/4',
+        'http://example.com/3',
+    ]
+
+
+def test_get_newest_articles_without_limit():
+    articles_streams = [
+        [article('http://example.com/2', '2019-02-01')],
+        [article('http://example.com/1', '2019-01-01')],
+    ]
+
+    assert len(list(articles.get_newest_articles(articles_streams))) == 2
+
+
+def test_get_newest_articles_is_lazy():
+    def articles_stream():
+        yield article('http://example.com/2', '2019-02-01')
+        yield article('http://example.com/1', '2019-01-01')
+        raise AssertionError('Stream should not have been exhausted')
+
+    assert [a['url'] for a in articles.get_newest_articles(
+        [articles_stream(), articles_stream()], limit=2
+    )] == ['http://example.com/2', 'http://example.com/2']
+
+
+@pytest.mark.parametrize('date', [
+    arrow.get('2019-01-01T10:00:00+00:00'),
+    datetime(2019, 1, 1, 10, tzinfo=timezone.utc),
+])
+def test_get_article_epoch(date):
+    assert articles.get_article_epoch({'date': date}) == 1546336800
+
+
+RSS_BYTES = '''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+    <channel>
+        <title>Feed</title>
+        <link>http://example.com/</link>
+        <item>
+            <title>Title 1 &amp; more</title>
+            <link> http://example.com/1.html </link>
+            <description>&lt;p&gt;Long description&lt;/p&gt;</description>
+            <pubDate>Fri, 22 Feb 2019 15:00:00 +0100</pubDate>
+        </item>
+        <item>
+            <title>Title 2</title>
+            <link>http://example.com/2.html</link>
+            <pubDate>Tue, 19 Feb 2019 17:00:00 GMT</pubDate>
+        </item>
+    </channel>
+</rss>
+'''.encode('utf-8')
+
+
+def test_rss_entries_from_bytes_rss():
+    rss_entries = articles.rss_entries_from_bytes(RSS_BYTES)
+
+    assert [(rss_entry.title, rss_entry.link, rss_entry.published_parsed)
+            for rss_entry in rss_entries] == [
+        ('Title 1 & more', 'http://example.com/1.html',
+         time.gmtime(1550844000)),
+        ('Title 2', 'http://example.com/2.html', time.gmtime(1550595600)),
+    ]
+
+
+@pytest.mark.parametrize('rss_bytes_', [
+    RSS_BYTES,
+    (Path(__file__).parent / 'feed.xml').read_bytes(),
+])
+def test_rss_entries_from_bytes_same_as_feedparser(rss_bytes_):
+    rss_entries = articles.rss_entries_from_bytes(rss_bytes_)
+    feedparser_entries = feedparser.parse(rss_bytes_).entries
+
+    assert [(rss_entry.title, rss_entry.link, rss_entry.published_parsed)
+            for rss_entry in rss_entries] == [
+        (rss_entry.title, rss_entry.link, rss_entry.published_parsed)
+        for rss_entry in feedparser_entries
+    ]
+
+
+@pytest.mark.parametrize('limit', [0, 1, 2, 3])
+def test_rss_entries_from_bytes_limit(rss_bytes, limit):
+    rss_entries = articles.rss_entries_from_bytes(rss_bytes, limit=limit)
+
+    assert [rss_entry.title for rss_entry in rss_entries] == [
+        'Title 1', 'Title 2',
+    ][:limit]
+
+
+def test_rss_entries_from_bytes_limit_stops_parsing():
+    # The second entry would make the streaming parser fall back
+    rss_bytes = RSS_BYTES.replace(b'http://example.com/2.html', b'2.html')
+    rss_entries = articles.rss_entries_from_bytes(rss_bytes, limit=1)
+
+    assert isinstance(rss_entries[0], SimpleNamespace)
+
+
+@pytest.mark.parametrize('rss_bytes_', [
+    RSS_BYTES.replace(b'</channel>', b''),  # malformed
+    RSS_BYTES.replace(b'http://example.com/2.html', b'2.html'),  # relative
+    RSS_BYTES.replace(b'<pubDate>Tue', b'<pubDate>Sometime on Tue'),
+])
+def test_rss_entries_from_bytes_falls_back_to_feedparser(rss_bytes_):
+    rss_entries = articles.rss_entries_from_bytes(rss_bytes_)
+
+    assert rss_entries[0].title == 'Title 1 & more'
+    assert not isinstance(rss_entries[0], SimpleNamespace)
+
+
+def archive_feed(slug):
+    return dict(feed(), slug=slug, rss_url=f'http://example.com/{slug}.xml')
+
+
+def test_get_archive():
+    feeds = [archive_feed('a'), archive_feed('b')]
+    articles_ = [
+        article(f'http://example.com/{i}', arrow.get(2019, 1, 1 + i),
+                feeds[0] if i < 3 else None)
+        for i in range(5)
+    ]
+    archive, archive_pages = articles.get_archive(articles_, feeds,
+                                                  per_page=2)
+
+    assert archive == {
+        'pages_count': 3,
+        'feeds': [
+            {'slug': 'a', 'title': 'Zprávičky o Pythonu na Root.cz',
+             'url': 'http://example.com', 'pages_count': 2},
+            {'slug': 'b', 'title': 'Zprávičky o Pythonu na Root.cz',
+             'url': 'http://example.com', 'pages_count': 1},
+        ],
+    }
+    assert archive_pages == {
+        'articles_page_1_data.json': {
+            'number': 1, 'pages_count': 3, 'articles': articles_[0:2],
+        },
+        'articles_page_2_data.json': {
+            'number': 2, 'pages_count': 3, 'articles': articles_[2:4],
+        },
+        'articles_page_3_data.json': {
+            'number': 3, 'pages_count': 3, 'articles': articles_[4:5],
+        },
+        'articles_feed_a_page_1_data.json': {
+            'number': 1, 'pages_count': 2, 'articles': articles_[0:2],
+        },
+        'articles_feed_a_page_2_data.json': {
+            'number': 2, 'pages_count': 2, 'articles': articles_[2:3],
+        },
+        'articles_feed_b_page_1_data.json': {
+            'number': 1, 'pages_count': 1, 'articles': [],
+        },
+    }
+
+
+def test_get_archive_empty():
+    archive, archive_pages = articles.get_archive([], [])
+
+    assert archive == {'pages_count': 1, 'feeds': []}
+    assert archive_pages == {
+        'articles_page_1_data.json': {
+            'number': 1, 'pages_count': 1, 'articles': [],
+        },
+    }
+
+
+@pytest.mark.parametrize('number, feed_slug, expected', [
+    (1, None, 'articles_page_1_data.json'),
+    (12, None, 'articles_page_12_data.json'),
+    (2, 'root-clanky', 'articles_feed_root-clanky_page_2_data.json'),
+])
+def test_get_archive_page_name(number, feed_slug, expected):
+    assert articles.get_archive_page_name(number, feed_slug) == expected
+
+
+@pytest.mark.parametrize('items, expected', [
+    ([], [[]]),
+    ([1, 2], [[1, 2]]),
+    ([1, 2, 3], [[1, 2], [3]]),
+    ([1, 2, 3, 4], [[1, 2], [3, 4]]),
+])
+def test_paginate(items, expected):
+    assert articles.paginate(items, 2) == expected
+
+
+@pytest.mark.parametrize('number,pages_count,expected', [
+    (1, 1, [1]),
+    (1, 3, [1, 2, 3]),
+    (1, 10, [1, 2, 3, None, 10]),
+    (5, 10, [1, None, 3, 4, 5, 6, 7, None, 10]),
+    (4, 10, [1, 2, 3, 4, 5, 6, None, 10]),
+    (10, 10, [1, None, 8, 9, 10]),
+])
+def test_get_page_numbers(number, pages_count, expected):
+    assert articles.get_page_numbers(number, pages_count) == expected
+
+
+def test_get_page_numbers_size_does_not_grow():
+    assert len(articles.get_page_numbers(500, 1000)) == (
+        len(articles.get_page_numbers(50, 100))
+    )
+
+
+def test_config_feeds_have_unique_slugs():
+    config_path = Path(articles.__file__).parent / 'config.yml'
+    config = yaml.safe_load(config_path.read_text())
+    slugs = [feed['slug'] for feed in config['feeds']]
+
+    assert len(set(slugs)) == len(slugs)
+    assert all(re.fullmatch(r'[a-z0-9\-]+', slug) for slug in slugs)
+
+
+def test_build_without_previous_archive(tmp_path, monkeypatch):
+    package_path = tmp_path / 'pythoncz' / 'pages' / 'articles'
+    package_path.mkdir(parents=True)
+    config = {'feeds': [archive_feed('a')], 'articles': []}
+    (package_path / 'config.yml').write_text(yaml.safe_dump(config))
+    monkeypatch.setattr(articles_main, 'fetch_all',
+                        lambda urls, **kwargs: [RSS_BYTES for url in urls])
+    articles_main.build(package_path)
+
+    built_articles = load_data(package_path / 'articles_data.json')
+    assert [article['url'] for article in built_articles] == [
+        'http://example.com/1.html', 'http://example.com/2.html',
+    ]
+    assert (package_path / 'articles_page_1_data.json').is_file()
+    assert (package_path / 'articles_feed_a_page_1_data.json').is_file()
@@ -1,32 +1,73 @@
 from pathlib import Path
 
 import arrow
-from flask import Response, render_template, jsonify
+from flask import Response, render_template, jsonify, abort
 
-from pythoncz import app
-from pythoncz.data import load_data
+from pythoncz.web import app
+from pythoncz.data import load_data, depends_on
+from pythoncz.pages.articles import (ARCHIVE_DATA_NAME, get_archive_page_name,
+                                     get_page_numbers)
 
 
-articles_data_path = Path(__file__).parent / 'articles_data.json'
+package_path = Path(__file__).parent
+articles_data_path = package_path / 'articles_data.json'
+archive_data_path = package_path / ARCHIVE_DATA_NAME
 
+# Pages of the archive are derived from the articles data, so they change
+# only together with it
+archive_data_paths = (articles_data_path, archive_data_path)
 
-@app.route('/articles/')
-def articles():
-    articles = load_data(articles_data_path, [], debug=app.debug)
-    articles = articles[:10]
-    return render_template('articles.html', articles=articles)
+
+@app.route('/articles/', defaults={'number': 1})
+@app.route('/articles/page/<int:number>/')
+@depends_on(*archive_data_paths)
+def articles(number):
+    return render_archive_page(number)
+
+
+@app.route('/articles/feeds/<slug>/', defaults={'number': 1})
+@app.route('/articles/feeds/<slug>/page/<int:number>/')
+@depends_on(*archive_data_paths)
+def articles_feed(slug, number):
+    return render_archive_page(number, slug)
+
+
+def render_archive_page(number, feed_slug=None):
+    archive = load_data(archive_data_path, {'pages_count': 1, 'feeds': []},
+                        debug=app.debug)
+    if feed_slug:
+        feeds = {feed['slug']: feed for feed in archive['feeds']}
+        if feed_slug not in feeds:
+            abort(404)
+        feed = feeds[feed_slug]
+        pages_count = feed['pages_count']
+    else:
+        feed = None
+        pages_count = archive['pages_count']
+    if not 1 <= number <= pages_count:
+        abort(404)
+
+    page_data_path = package_path / get_archive_page_name(number, feed_slug)
+    archive_page = load_data(page_data_path, {'articles': []},
+                             debug=app.debug)
+    return render_template('articles.html', articles=archive_page['articles'],
+                           number=number, pages_count=pages_count,
+                           page_numbers=get_page_numbers(number, pages_count),
+                           feed=feed, feeds=archive['feeds'])
 
 
 @app.route('/articles.xml')
+@depends_on(articles_data_path)
 def articles_rss():
-    articles = load_data(articles_data_path, [], debug=app.debug)
-    articles = articles[:50]
+    articles = load_data(articles_data_path, [], debug=app.debug,
+                         records=slice(50))
     rss_text = render_template('articles.xml',
                                date=arrow.utcnow(), articles=articles)
     return Response(rss_text, mimetype='application/xml')
 
 
 @app.route('/articles.json')
+@depends_on(articles_data_path)
 def articles_json():
     articles = load_data(articles_data_path, [], debug=app.debug)
     return jsonify(list(articles))
@@ -81,9 +81,5 @@ def event_to_ics_event(event):
     )
 
 
-def is_within_three_months(now_dt):
-    in_three_months_dt = now_dt.replace(months=+3)
-
-    def predicate(event):
-        return now_dt <= event['begins_at'] <= in_three_months_dt
-    return predicate
+def get_three_months_window(now_dt):
+    return now_dt, now_dt.replace(months=+3)
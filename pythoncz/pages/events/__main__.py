@@ -1,30 +1,30 @@
 from pathlib import Path
 
-import requests
 import yaml
 
 from pythoncz.data import save_data
+from pythoncz.fetch import HTTP_CACHE_PATH, fetch_all, fetch_text
 from pythoncz.pages.events import (sort_events, get_events,
                                    ics_events_from_text)
 
 
-def download_ics_as_text(ics_url):
-    try:
-        response = requests.get(ics_url)
-        response.raise_for_status()
-        return response.text
-    except Exception as request_exc:
-        exc = RuntimeError(f'Could not get iCalendar feed from {ics_url}')
-        raise exc from request_exc
+def build():
+    config_path = Path(__file__).parent / 'config.yml'
+    config = yaml.safe_load(config_path.read_text())
 
+    feeds = config['feeds']
+    feeds_texts = fetch_all((feed['ics_url'] for feed in feeds),
+                            fetch=fetch_text, cache_path=HTTP_CACHE_PATH)
+    events = sort_events(get_events(
+        (feed, ics_events_from_text(ics_text))
+        for feed, ics_text in zip(feeds, feeds_texts)
+    ))
 
-config_path = Path(__file__).parent / 'config.yml'
-config = yaml.safe_load(config_path.read_text())
+    # Views ask for events within a time window, which the index on
+    # 'begins_at' answers without loading all the events
+    data_path = Path(__file__).parent / 'events_data.json'
+    save_data(data_path, events, format='sqlite', indexes=['begins_at'])
 
-events = sort_events(get_events(
-    (feed, ics_events_from_text(download_ics_as_text(feed['ics_url'])))
-    for feed in config['feeds']
-))
 
-data_path = Path(__file__).parent / 'events_data.json'
-save_data(data_path, list(events))
+if __name__ == '__main__':
+    build()
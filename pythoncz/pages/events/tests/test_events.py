@@ -190,10 +190,10 @@ def test_get_ics_event_url(event, expected_url):
     ('2019-11-30', True),
     ('2019-12-01', False),
 ])
-def test_is_within_three_months(begins_at, expected):
-    predicate = events.is_within_three_months(arrow.get('2019-08-30'))
+def test_get_three_months_window(begins_at, expected):
+    since, until = events.get_three_months_window(arrow.get('2019-08-30'))
 
-    assert predicate({'begins_at': arrow.get(begins_at)}) is expected
+    assert (since <= arrow.get(begins_at) <= until) is expected
 
 
 def test_sort_events():
@@ -3,30 +3,34 @@ from pathlib import Path
 import arrow
 from flask import Response, render_template, jsonify
 
-from pythoncz import app
-from pythoncz.data import load_data
-from pythoncz.pages.events import events_to_ics_text, is_within_three_months
+from pythoncz.web import app
+from pythoncz.data import query_data, depends_on
+from pythoncz.pages.events import events_to_ics_text, get_three_months_window
 
 
 events_data_path = Path(__file__).parent / 'events_data.json'
 
 
 @app.route('/events/')
+@depends_on(events_data_path, daily=True)
 def events():
-    events = load_data(events_data_path, [], debug=app.debug)
-    events = filter(is_within_three_months(arrow.utcnow()), events)
-    return render_template('events.html', events=events)
+    return render_template('events.html', events=query_upcoming_events())
 
 
 @app.route('/events.ics')
+@depends_on(events_data_path, daily=True)
 def events_ics():
-    events = load_data(events_data_path, [], debug=app.debug)
-    events = filter(is_within_three_months(arrow.utcnow()), events)
+    events = query_upcoming_events()
     return Response(events_to_ics_text(events), mimetype='text/calendar')
 
 
 @app.route('/events.json')
+@depends_on(events_data_path, daily=True)
 def events_json():
-    events = load_data(events_data_path, [], debug=app.debug)
-    events = filter(is_within_three_months(arrow.utcnow()), events)
-    return jsonify(list(events))
+    return jsonify(query_upcoming_events())
+
+
+def query_upcoming_events():
+    since, until = get_three_months_window(arrow.utcnow())
+    return query_data(events_data_path, 'begins_at', since=since, until=until,
+                      default=[], debug=app.debug)
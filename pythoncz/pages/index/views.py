@@ -1,13 +1,16 @@
 from flask import render_template
 
-from pythoncz import app
+from pythoncz.web import app
+from pythoncz.data import depends_on
 
 
 @app.route('/')
+@depends_on()
 def index():
     return render_template('index.html')
 
 
 @app.route('/en/')
+@depends_on()
 def index_en():
     return render_template('index.html')
@@ -3,13 +3,13 @@ import itertools
 import functools
 from pathlib import Path
 
-import requests
 import yaml
 import geocoder
 from unidecode import unidecode
 
 from pythoncz import log
 from pythoncz.data import save_data
+from pythoncz.fetch import FetchError, fetch_bytes, map_concurrently
 from pythoncz.pages.jobs import (get_jobs, jobs_from_bytes, stats_from_jobs,
                                  companies_from_jobs, group_by_pagination,
                                  paginate_url, get_job_details_parser,
@@ -20,59 +20,40 @@ from pythoncz.pages.jobs import (get_jobs, jobs_from_bytes, stats_from_jobs,
 logger = log.get('pythoncz.pages.jobs')
 
 
-def download_as_bytes(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.content
-
-
 def download_feed(feed):
     url = feed['feed_url']
-    try:
-        logger.info(f"Downloading {url}")
-        response_bytes = download_as_bytes(url)
-    except Exception as request_exc:
-        exc = RuntimeError(f'Could not get jobs feed from {url}')
-        raise exc from request_exc
-    return jobs_from_bytes(feed['id'], response_bytes, url)
+    return list(jobs_from_bytes(feed['id'], fetch_bytes(url), url))
 
 
 def download_feed_paginated(feed):
+    jobs = []
     page = 1
     while True:
         url = paginate_url(feed['feed_url'], page)
         try:
-            logger.info(f"Downloading {url}")
-            response_bytes = download_as_bytes(url)
-        except requests.HTTPError:
+            response_bytes = fetch_bytes(url)
+        except FetchError as exc:
+            if exc.status_code:
+                break
+            raise
+
+        page_jobs = list(jobs_from_bytes(feed['id'], response_bytes, url))
+        if not page_jobs:
             break
-        except Exception as request_exc:
-            exc = RuntimeError(f'Could not get jobs feed from {url}')
-            raise exc from request_exc
-
-        jobs = list(jobs_from_bytes(feed['id'], response_bytes, url))
-        if not jobs:
-            break
-        yield from jobs
+        jobs.extend(page_jobs)
         page += 1
+    return jobs
 
 
 def download_job_details(job):
     try:
         job_details_from_bytes = get_job_details_parser(job['feed']['id'])
     except ValueError:
-        yield job
-    else:
-        url = job['url']
-        try:
-            logger.info(f"Downloading {url}")
-            response_bytes = download_as_bytes(url)
-        except Exception as request_exc:
-            exc = RuntimeError(f'Could not get job details from {url}')
-            raise exc from request_exc
+        return [job]
 
-        for job_details in job_details_from_bytes(response_bytes, url):
-            yield {**job, **job_details}
+    url = job['url']
+    return [{**job, **job_details} for job_details
+            in job_details_from_bytes(fetch_bytes(url), url)]
 
 
 @functools.lru_cache()
@@ -112,37 +93,43 @@ def is_relevant_job_with_logging(job, agencies):
     return is_relevant
 
 
-config_path = Path(__file__).parent / 'config.yml'
-config = yaml.safe_load(config_path.read_text())
-
-google_api_key = os.getenv('GOOGLE_API_KEY')
-if not google_api_key:
-    raise ValueError('Environment variable GOOGLE_API_KEY is not set')
+def build():
+    config_path = Path(__file__).parent / 'config.yml'
+    config = yaml.safe_load(config_path.read_text())
 
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        raise ValueError('Environment variable GOOGLE_API_KEY is not set')
 
-paginated_feeds, not_paginaged_feeds = group_by_pagination(config['feeds'])
-paginated_feeds_jobs = (
-    (feed, download_feed_paginated(feed))
-    for feed in paginated_feeds
-)
-not_paginaged_feeds_jobs = (
-    (feed, download_feed(feed))
-    for feed in not_paginaged_feeds
-)
+    paginated_feeds, not_paginaged_feeds = \
+        group_by_pagination(config['feeds'])
+    paginated_feeds_jobs = zip(
+        paginated_feeds,
+        map_concurrently(download_feed_paginated, paginated_feeds),
+    )
+    not_paginaged_feeds_jobs = zip(
+        not_paginaged_feeds,
+        map_concurrently(download_feed, not_paginaged_feeds),
+    )
 
+    feeds_jobs = itertools.chain(paginated_feeds_jobs,
+                                 not_paginaged_feeds_jobs)
+    jobs = (job for job in get_jobs(feeds_jobs)
+            if is_relevant_job_with_logging(job, config['agencies']))
+    jobs = itertools.chain.from_iterable(
+        map_concurrently(download_job_details, jobs)
+    )
+    jobs = [geocode_job_location(job, google_api_key) for job in jobs]
 
-feeds_jobs = itertools.chain(paginated_feeds_jobs, not_paginaged_feeds_jobs)
-jobs = (job for job in get_jobs(feeds_jobs)
-        if is_relevant_job_with_logging(job, config['agencies']))
-jobs = itertools.chain.from_iterable(map(download_job_details, jobs))
-jobs = [geocode_job_location(job, google_api_key) for job in jobs]
+    data_path = Path(__file__).parent / 'jobs_data.json'
+    save_data(data_path, jobs)
 
+    data_path = Path(__file__).parent / 'stats_data.json'
+    save_data(data_path, stats_from_jobs(jobs))
 
-data_path = Path(__file__).parent / 'jobs_data.json'
-save_data(data_path, jobs)
+    data_path = Path(__file__).parent / 'companies_data.json'
+    save_data(data_path, companies_from_jobs(jobs))
 
-data_path = Path(__file__).parent / 'stats_data.json'
-save_data(data_path, stats_from_jobs(jobs))
 
-data_path = Path(__file__).parent / 'companies_data.json'
-save_data(data_path, companies_from_jobs(jobs))
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import pytest
+
+
+PAGES_PATH = Path(__file__).parent
+PAGES_NAMES = sorted(path.name for path in PAGES_PATH.iterdir()
+                     if (path / '__init__.py').is_file())
+PAGE_BUILDERS_NAMES = sorted(path.name for path in PAGES_PATH.iterdir()
+                             if (path / '__main__.py').is_file())
+
+WEB_MODULES = ('pythoncz.web', 'flask', 'jinja2', 'werkzeug')
+
+
+def test_package_does_not_construct_app(import_module):
+    modules, _ = import_module('pythoncz')
+
+    assert not [name for name in WEB_MODULES if name in modules]
+
+
+@pytest.mark.parametrize('page_name', PAGES_NAMES)
+def test_page_library_does_not_construct_app(page_name, import_module):
+    modules, _ = import_module(f'pythoncz.pages.{page_name}')
+
+    assert not [name for name in WEB_MODULES if name in modules]
+
+
+@pytest.mark.parametrize('page_name', PAGE_BUILDERS_NAMES)
+def test_page_builder_does_not_construct_app(page_name, import_module):
+    modules, _ = import_module(f'pythoncz.pages.{page_name}.__main__')
+
+    assert not [name for name in WEB_MODULES if name in modules]
+
+
+def test_app_registers_views(import_module):
+    modules, _ = import_module('pythoncz.web')
+
+    assert 'pythoncz.pages.index.views' in modules
+    assert 'pythoncz.pages.articles.views' in modules
+    assert 'pythoncz.pages.events.views' in modules
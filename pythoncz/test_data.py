@@ -0,0 +1,440 @@
+import os
+import json
+from datetime import datetime, timezone
+
+import arrow
+import pytest
+
+from pythoncz import data
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    package_path = tmp_path / 'pythoncz' / 'pages' / 'foo'
+    package_path.mkdir(parents=True)
+    return package_path / 'foo_data.json'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    data.clear_cache()
+    yield
+    data.clear_cache()
+
+
+def test_save_data_load_data(data_path):
+    dt = datetime(2019, 3, 7, 10, 46, 19, tzinfo=timezone.utc)
+    data.save_data(data_path, [{'title': 'Title', 'date': dt}])
+
+    assert data.load_data(data_path) == [{'title': 'Title', 'date': dt}]
+
+
+def test_load_data_missing_debug(data_path):
+    assert data.load_data(data_path, [], debug=True) == []
+
+
+def test_load_data_missing(data_path):
+    with pytest.raises(FileNotFoundError):
+        data.load_data(data_path)
+
+
+def test_load_data_cache_hit(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+
+    first = data.load_data(data_path)
+    second = data.load_data(data_path)
+
+    assert second is first
+    assert data.cache_info() == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_load_data_cache_invalidated_by_rewrite(data_path):
+    data.save_data(data_path, [{'title': 'Title 1'}])
+    data.load_data(data_path)
+
+    data.save_data(data_path, [{'title': 'Title 2'}, {'title': 'Title 3'}])
+
+    assert data.load_data(data_path) == [{'title': 'Title 2'},
+                                         {'title': 'Title 3'}]
+    assert data.cache_info() == {'hits': 0, 'misses': 2, 'size': 1}
+
+
+def test_load_data_cache_invalidated_by_mtime(data_path):
+    data.save_data(data_path, [{'title': 'Title 1'}])
+    data.load_data(data_path)
+
+    data_path.write_text('[{"title": "Title 2"}]')
+    os.utime(data_path, ns=(0, 0))
+
+    assert data.load_data(data_path) == [{'title': 'Title 2'}]
+
+
+def test_save_data_writes_types(data_path):
+    dt = datetime(2019, 3, 7, 10, 46, 19, tzinfo=timezone.utc)
+    data.save_data(data_path, [
+        {'title': 'Title 1', 'date': dt, 'feed': {'updated_at': dt}},
+        {'title': 'Title 2', 'date': dt, 'feed': None},
+    ])
+    types_path = data_path.parent / 'foo_data.types.json'
+
+    assert json.loads(types_path.read_text()) == {
+        'datetime_fields': [['date'], ['feed', 'updated_at']],
+    }
+
+
+def test_load_data_decodes_only_datetime_fields(data_path):
+    dt = datetime(2019, 3, 7, 10, 46, 19, 123456, tzinfo=timezone.utc)
+    data.save_data(data_path, {
+        'items': [{'title': '2019-03-07T10:46:19+00:00', 'date': dt}],
+        'dates': [dt, dt],
+    })
+
+    assert data.load_data(data_path) == {
+        'items': [{'title': '2019-03-07T10:46:19+00:00', 'date': dt}],
+        'dates': [dt, dt],
+    }
+
+
+def test_load_data_without_types(data_path):
+    data_path.write_text('[{"date": "2019-03-07T10:46:19+00:00"}]')
+
+    assert data.load_data(data_path) == [
+        {'date': datetime(2019, 3, 7, 10, 46, 19, tzinfo=timezone.utc)},
+    ]
+
+
+@pytest.mark.parametrize('o,expected', [
+    ([], set()),
+    ({'title': 'Title'}, set()),
+    ([{'date': arrow.get('2019-03-07')}], {('date',)}),
+    ({'feed': {'date': datetime(2019, 3, 7)}}, {('feed', 'date')}),
+    ([{'date': datetime(2019, 3, 7)}, {'date': None}], {('date',)}),
+    ([{'date': datetime(2019, 3, 7)}, {'date': 'hello'}], set()),
+    ([{'x': datetime(2019, 3, 7)}, {'x': {'y': datetime(2019, 3, 7)}}],
+     {('x',), ('x', 'y')}),
+])
+def test_get_datetime_fields(o, expected):
+    field_types = {}
+    data.update_field_types(field_types, o)
+
+    assert data.get_datetime_fields(field_types) == expected
+
+
+def test_to_fields_tree():
+    leaf = data.FIELDS_TREE_LEAF
+
+    assert data.to_fields_tree([['date'], ['feed'], ['feed', 'at']]) == {
+        'date': {leaf: True},
+        'feed': {leaf: True, 'at': {leaf: True}},
+    }
+
+
+def test_load_data_mixed_datetime_and_string(data_path):
+    dt = datetime(2019, 3, 7, 10, 46, 19, tzinfo=timezone.utc)
+    data.save_data(data_path, [{'x': dt}, {'x': 'hello'}])
+
+    assert data.load_data(data_path) == [
+        {'x': '2019-03-07T10:46:19+00:00'},
+        {'x': 'hello'},
+    ]
+
+
+@pytest.mark.parametrize('format', ['json', 'sqlite'])
+def test_load_data_datetime_field_with_nested_fields(data_path, format):
+    dt = datetime(2019, 3, 7, 10, 46, 19, tzinfo=timezone.utc)
+    records = [{'x': dt}, {'x': {'y': dt}}]
+    data.save_data(data_path, records, format=format)
+
+    assert data.load_data(data_path) == records
+
+
+@pytest.mark.parametrize('records', [
+    [],
+    [{'title': 'Title'}],
+    [{'title': 'Title 1', 'tags': ['a', 'b']}, {'title': 'Title 2'}, 'foo'],
+])
+def test_save_data_streams_same_output_as_json_dumps(data_path, records):
+    data.save_data(data_path, (record for record in records))
+
+    assert data_path.read_text() == json.dumps(records, indent=2)
+
+
+def test_save_data_dict(data_path):
+    data.save_data(data_path, {'jobs_count': 42})
+
+    assert data_path.read_text() == '{\n  "jobs_count": 42\n}'
+
+
+def test_save_data_keeps_previous_data_on_error(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+
+    def records():
+        yield {'title': 'New title'}
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        data.save_data(data_path, records())
+
+    assert data.load_data(data_path) == [{'title': 'Title'}]
+    assert sorted(path.name for path in data_path.parent.iterdir()) == [
+        'foo_data.index',
+        'foo_data.json',
+        'foo_data.sha256',
+        'foo_data.types.json',
+    ]
+
+
+def test_save_data_writes_hash(data_path):
+    assert data.get_data_hash(data_path) is None
+
+    assert data.save_data(data_path, [{'title': 'Title'}]) is True
+
+    hash_path = data_path.parent / 'foo_data.sha256'
+    assert data.get_data_hash(data_path) == hash_path.read_text()
+    assert len(hash_path.read_text()) == 64
+
+
+def test_save_data_file_mode(data_path):
+    (data_path.parent / 'plain.txt').write_text('')
+    data.save_data(data_path, [{'title': 'Title'}])
+
+    modes = {path.name: path.stat().st_mode
+             for path in data_path.parent.iterdir()}
+    assert set(modes.values()) == {modes['plain.txt']}
+
+
+def test_save_data_skips_unchanged(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+    os.utime(data_path, ns=(0, 0))
+    data_hash = data.get_data_hash(data_path)
+
+    assert data.save_data(data_path, [{'title': 'Title'}]) is False
+    assert data_path.stat().st_mtime_ns == 0
+    assert data.get_data_hash(data_path) == data_hash
+
+
+def test_save_data_hash_changes_with_data(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+    data_hash = data.get_data_hash(data_path)
+
+    assert data.save_data(data_path, [{'title': 'Title 2'}]) is True
+    assert data.get_data_hash(data_path) != data_hash
+
+
+def test_save_data_hash_changes_with_types(data_path):
+    data.save_data(data_path, [{'date': '2019-03-07T00:00:00+00:00'}])
+    data_hash = data.get_data_hash(data_path)
+
+    assert data.save_data(data_path, [{'date': arrow.get('2019-03-07')}])
+    assert data.get_data_hash(data_path) != data_hash
+
+
+def test_save_data_rewrites_missing_file(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+    data_path.unlink()
+
+    assert data.save_data(data_path, [{'title': 'Title'}]) is True
+    assert data.load_data(data_path) == [{'title': 'Title'}]
+
+
+@pytest.mark.parametrize('records', [
+    [],
+    [{'title': 'Title', 'date': arrow.get('2019-03-07T10:46:19.5+01:00')}],
+    [{'at': datetime(2019, 3, 7, 10, 46, 19)}, {'at': [datetime(1969, 1, 1)]}],
+])
+def test_save_data_load_data_msgpack(data_path, records):
+    data.save_data(data_path, iter(records), format='msgpack')
+
+    assert data.load_data(data_path) == records
+    assert (data_path.parent / 'foo_data.msgpack').is_file()
+
+
+def test_save_data_load_data_msgpack_dict(data_path):
+    data.save_data(data_path, {'jobs_count': 42}, format='msgpack')
+
+    assert data.load_data(data_path) == {'jobs_count': 42}
+
+
+def test_save_data_msgpack_keeps_utc_offset(data_path):
+    dt = arrow.get('2019-03-07T10:46:19+01:00')
+    data.save_data(data_path, [{'date': dt}], format='msgpack')
+
+    date = data.load_data(data_path)[0]['date']
+    assert date.isoformat() == '2019-03-07T10:46:19+01:00'
+
+
+def test_save_data_switching_formats(data_path):
+    data.save_data(data_path, [{'title': 'Title 1'}])
+    data.save_data(data_path, [{'title': 'Title 2'}], format='msgpack')
+
+    assert data.load_data(data_path) == [{'title': 'Title 2'}]
+    assert sorted(path.name for path in data_path.parent.iterdir()) == [
+        'foo_data.index',
+        'foo_data.msgpack',
+        'foo_data.sha256',
+    ]
+
+    data.save_data(data_path, [{'title': 'Title 3'}])
+
+    assert data.load_data(data_path) == [{'title': 'Title 3'}]
+    assert sorted(path.name for path in data_path.parent.iterdir()) == [
+        'foo_data.index',
+        'foo_data.json',
+        'foo_data.sha256',
+        'foo_data.types.json',
+    ]
+
+
+def test_save_data_unknown_format(data_path):
+    with pytest.raises(ValueError):
+        data.save_data(data_path, [], format='xml')
+
+
+@pytest.mark.parametrize('format', data.FORMATS)
+@pytest.mark.parametrize('records', [
+    slice(None),
+    slice(3),
+    slice(10),
+    slice(20),
+    slice(5, 8),
+    slice(-2, None),
+    slice(1, 10, 3),
+    slice(None, None, -1),
+    slice(8, 2, -2),
+    slice(5, 5),
+])
+def test_load_data_records(data_path, format, records):
+    articles = [{'title': f'Title {i}', 'date': arrow.get(2019, 3, i + 1),
+                 'feed': {'title': 'Feed'}}
+                for i in range(10)]
+    data.save_data(data_path, articles, format=format)
+
+    assert data.load_data(data_path, records=records) == [
+        {**article, 'date': article['date'].datetime}
+        for article in articles[records]
+    ]
+
+
+def test_load_data_records_empty(data_path):
+    data.save_data(data_path, [])
+
+    assert data.load_data(data_path, records=slice(10)) == []
+
+
+def test_load_data_records_outdated_index(data_path):
+    data.save_data(data_path, [{'title': 'Title 1'}])
+    data_path.write_text('[{"title": "Title 2"}, {"title": "Title 3"}]')
+
+    assert data.load_data(data_path, records=slice(1)) == [
+        {'title': 'Title 2'},
+    ]
+
+
+def test_load_data_records_cache(data_path):
+    data.save_data(data_path, [{'title': 'Title 1'}, {'title': 'Title 2'}])
+
+    data.load_data(data_path, records=slice(1))
+    data.load_data(data_path, records=slice(1))
+    data.load_data(data_path)
+
+    assert data.cache_info() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_save_data_dict_removes_index(data_path):
+    data.save_data(data_path, [{'title': 'Title'}])
+    data.save_data(data_path, {'jobs_count': 42})
+
+    assert not (data_path.parent / 'foo_data.index').exists()
+
+
+@pytest.mark.parametrize('format', ['json', 'msgpack', 'sqlite'])
+def test_remove_data(data_path, format):
+    (data_path.parent / 'bar_data.json').write_text('[]')
+    data.save_data(data_path, [{'title': 'Title'}], format=format)
+    data.remove_data(data_path)
+
+    assert [path.name for path in data_path.parent.iterdir()] == [
+        'bar_data.json',
+    ]
+    with pytest.raises(FileNotFoundError):
+        data.load_data(data_path)
+
+
+def test_remove_data_missing(data_path):
+    data.remove_data(data_path)
+
+
+def events():
+    return [
+        {'name': 'Pyvo', 'begins_at': arrow.get('2019-03-07T18:00:00+01:00'),
+         'ends_at': datetime(2019, 3, 7, 21), 'location': {'city': 'Brno'}},
+        {'name': 'PyCon CZ', 'begins_at': arrow.get('2019-06-14T09:00:00'),
+         'ends_at': datetime(2019, 6, 16, 18),
+         'location': {'city': 'Ostrava'}},
+        {'name': 'Sprint', 'begins_at': None, 'ends_at': None,
+         'location': None},
+        {'name': 'PyData', 'begins_at': arrow.get('2019-03-07T17:30:00Z'),
+         'ends_at': datetime(2019, 3, 7, 19), 'location': {'city': 'Praha'}},
+    ]
+
+
+def test_save_data_load_data_sqlite(data_path):
+    data.save_data(data_path, iter(events()), format='sqlite',
+                   indexes=['begins_at', 'location.city'])
+
+    assert data.load_data(data_path) == events()
+    assert data.load_data(data_path, records=slice(1, 3)) == events()[1:3]
+    assert data.load_data(data_path, records=slice(None, None, -2)) \
+        == events()[::-2]
+    assert (data_path.parent / 'foo_data.sqlite').is_file()
+
+
+def test_save_data_load_data_sqlite_dict(data_path):
+    data.save_data(data_path, {'jobs_count': 42}, format='sqlite')
+
+    assert data.load_data(data_path) == {'jobs_count': 42}
+
+
+def test_save_data_sqlite_skips_unchanged(data_path):
+    assert data.save_data(data_path, events(), format='sqlite') is True
+    assert data.save_data(data_path, events(), format='sqlite') is False
+    assert data.save_data(data_path, events(), format='sqlite',
+                          indexes=['begins_at']) is True
+
+
+@pytest.mark.parametrize('format,indexes', [
+    ('json', []),
+    ('sqlite', []),
+    ('sqlite', ['begins_at', 'location.city']),
+])
+@pytest.mark.parametrize('kwargs,expected_names', [
+    (dict(field='begins_at'), ['Pyvo', 'PyData', 'PyCon CZ']),
+    (dict(field='begins_at', descending=True, limit=2),
+     ['PyCon CZ', 'PyData']),
+    (dict(field='begins_at', since=arrow.get('2019-03-07T17:15:00Z'),
+          until=arrow.get('2019-06-14T09:00:00')), ['PyData', 'PyCon CZ']),
+    (dict(field='location.city', since='Ostrava'), ['PyCon CZ', 'PyData']),
+    # naive datetimes are treated as UTC
+    (dict(field='ends_at', since=arrow.get('2019-03-07T20:00:00Z')),
+     ['Pyvo', 'PyCon CZ']),
+])
+def test_query_data(data_path, format, indexes, kwargs, expected_names):
+    data.save_data(data_path, events(), format=format, indexes=indexes)
+    records = data.query_data(data_path, **kwargs)
+
+    assert [record['name'] for record in records] == expected_names
+
+
+def test_query_data_missing_debug(data_path):
+    assert data.query_data(data_path, 'begins_at', default=[],
+                           debug=True) == []
+
+
+@pytest.mark.parametrize('record,field,expected', [
+    ({'a': 1}, 'a', 1),
+    ({'a': {'b': 2}}, 'a.b', 2),
+    ({'a': None}, 'a.b', None),
+    ({}, 'a', None),
+])
+def test_get_field(record, field, expected):
+    assert data.get_field(record, field) == expected
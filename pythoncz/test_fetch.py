@@ -0,0 +1,207 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from pythoncz import fetch
+
+
+LAST_MODIFIED = 'Tue, 15 Oct 2019 10:00:00 GMT'
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/wait'):
+            self.wait()
+        elif self.path.startswith('/slow'):
+            time.sleep(0.5)
+
+        if self.path == '/missing':
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.is_not_modified():
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        # Slow responses finish only after their test is over
+        if not self.path.startswith('/slow'):
+            self.server.full_responses.append(self.path)
+        content = f'Příliš žluťoučký kůň {self.path}'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        if self.path.startswith('/etag'):
+            self.send_header('ETag', self.server.etag)
+        if self.path.startswith('/last-modified'):
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def wait(self):
+        server = self.server
+        with server.lock:
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        try:
+            time.sleep(0.05)
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    def is_not_modified(self):
+        if self.path.startswith('/etag'):
+            return self.headers.get('If-None-Match') == self.server.etag
+        if self.path.startswith('/last-modified'):
+            return self.headers.get('If-Modified-Since') == LAST_MODIFIED
+        return False
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.running = 0
+    server.max_running = 0
+    server.full_responses = []
+    server.etag = '"1"'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    server.max_running = 0
+    server.full_responses = []
+    server.etag = '"1"'
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_fetch_bytes(base_url):
+    assert fetch.fetch_bytes(f'{base_url}/feed') == (
+        'Příliš žluťoučký kůň /feed'.encode('utf-8')
+    )
+
+
+def test_fetch_text(base_url):
+    assert fetch.fetch_text(f'{base_url}/feed') == (
+        'Příliš žluťoučký kůň /feed'
+    )
+
+
+def test_fetch_http_error(base_url):
+    url = f'{base_url}/missing'
+    with pytest.raises(fetch.FetchError) as exc_info:
+        fetch.fetch(url)
+
+    assert exc_info.value.url == url
+    assert exc_info.value.status_code == 404
+    assert str(exc_info.value) == f'Could not get {url}'
+
+
+def test_fetch_timeout(base_url):
+    with pytest.raises(fetch.FetchError) as exc_info:
+        fetch.fetch(f'{base_url}/slow', timeout=0.1)
+
+    assert exc_info.value.status_code is None
+
+
+def test_fetch_connection_error():
+    with pytest.raises(fetch.FetchError) as exc_info:
+        fetch.fetch('http://127.0.0.1:1/')
+
+    assert exc_info.value.status_code is None
+
+
+def test_fetch_all_keeps_order(base_url):
+    urls = [f'{base_url}/wait/{i}' for i in range(10)]
+
+    assert list(fetch.fetch_all(urls, fetch=fetch.fetch_text)) == [
+        f'Příliš žluťoučký kůň /wait/{i}' for i in range(10)
+    ]
+
+
+def test_fetch_all_bounded_concurrency(base_url, server):
+    urls = [f'{base_url}/wait/{i}' for i in range(12)]
+    list(fetch.fetch_all(urls, max_workers=3))
+
+    assert 1 < server.max_running <= 3
+
+
+def test_fetch_all_error(base_url):
+    urls = [f'{base_url}/feed', f'{base_url}/missing']
+
+    with pytest.raises(fetch.FetchError):
+        list(fetch.fetch_all(urls))
+
+
+def test_map_concurrently():
+    assert list(fetch.map_concurrently(str.upper, ['a', 'b', 'c'])) == [
+        'A', 'B', 'C',
+    ]
+
+
+def test_get_session_is_shared():
+    assert fetch.get_session() is fetch.get_session()
+
+
+@pytest.mark.parametrize('path', ['/etag', '/last-modified'])
+def test_fetch_cache(base_url, server, tmp_path, path):
+    url = f'{base_url}{path}'
+    content = fetch.fetch_bytes(url, cache_path=tmp_path)
+
+    assert fetch.fetch_bytes(url, cache_path=tmp_path) == content
+    assert fetch.fetch_text(url, cache_path=tmp_path) == (
+        f'Příliš žluťoučký kůň {path}'
+    )
+    assert server.full_responses == [path]
+
+
+def test_fetch_cache_changed(base_url, server, tmp_path):
+    url = f'{base_url}/etag'
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+    server.etag = '"2"'
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+
+    assert server.full_responses == ['/etag', '/etag']
+
+
+def test_fetch_cache_without_validators(base_url, server, tmp_path):
+    url = f'{base_url}/feed'
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+
+    assert server.full_responses == ['/feed', '/feed']
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fetch_cache_with_missing_content(base_url, server, tmp_path):
+    url = f'{base_url}/etag'
+    fetch.fetch_bytes(url, cache_path=tmp_path)
+    for path in tmp_path.glob('*.body'):
+        path.unlink()
+
+    assert fetch.fetch_bytes(url, cache_path=tmp_path) == (
+        'Příliš žluťoučký kůň /etag'.encode('utf-8')
+    )
+    assert server.full_responses == ['/etag', '/etag']
+
+
+def test_fetch_all_cache(base_url, server, tmp_path):
+    urls = [f'{base_url}/etag/{i}' for i in range(3)]
+    list(fetch.fetch_all(urls, fetch=fetch.fetch_text, cache_path=tmp_path))
+
+    assert list(fetch.fetch_all(urls, fetch=fetch.fetch_text,
+                                cache_path=tmp_path)) == [
+        f'Příliš žluťoučký kůň /etag/{i}' for i in range(3)
+    ]
+    assert sorted(server.full_responses) == [f'/etag/{i}' for i in range(3)]
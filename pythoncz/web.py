@@ -0,0 +1,11 @@
+from flask import Flask
+
+
+app = Flask('pythoncz')
+
+app.config['JSON_AS_ASCII'] = False
+
+
+import pythoncz.pages.index.views
+import pythoncz.pages.articles.views
+import pythoncz.pages.events.views
@@ -29,11 +29,18 @@ def test_ci_config_runs_all_page_builders(builder_name, config):
 
     assert job['executor'] == 'python'
     assert job['steps'][0] == {'attach_workspace': {'at': '~'}}
-    assert job['steps'][1] == {'run': f'pipenv run build {builder_name}'}
-    assert job['steps'][2] == {
+    assert job['steps'][1] == {
+        'restore_cache': {'keys': [f'http-cache-{builder_name}-']}
+    }
+    assert job['steps'][2] == {'run': f'pipenv run build {builder_name}'}
+    assert job['steps'][3]['save_cache']['key'] == (
+        f'http-cache-{builder_name}-{{{{ epoch }}}}'
+    )
+    assert job['steps'][3]['save_cache']['paths'][0] == '.cache/http'
+    assert job['steps'][4] == {
         'persist_to_workspace': {
             'root': '~',
-            'paths': [f'project/pythoncz/pages/{builder_name}/*_data.json']
+            'paths': [f'project/pythoncz/pages/{builder_name}/*_data.*']
         }
     }
 
@@ -66,3 +73,41 @@ def test_ci_config_workflow_fans_into_web_build(config):
     assert default_workflow_jobs[builders_count + 1] == {
         'build_web': {'requires': builders_job_names}
     }
+
+
+def test_ci_config_web_build_keeps_previous_build(config):
+    steps = config['jobs']['build_web']['steps']
+
+    assert steps[1] == {
+        'restore_cache': {'keys': ['web-build-{{ .Branch }}-']}
+    }
+    assert steps[3] == {'run': 'pipenv run build web'}
+    assert steps[4]['save_cache']['key'] == (
+        'web-build-{{ .Branch }}-{{ epoch }}'
+    )
+    assert '.cache/web_build_manifest.json' in steps[4]['save_cache']['paths']
+    assert 'build' in steps[4]['save_cache']['paths']
+
+
+def test_ci_config_web_build_installs_png_optimizer(config):
+    steps = config['jobs']['build_web']['steps']
+    build_index = steps.index({'run': 'pipenv run build web'})
+    commands = [step['run']['command'] for step in steps[:build_index]
+                if 'run' in step]
+
+    assert any('install -y optipng' in command for command in commands)
+
+
+def test_ci_config_deploy_keeps_deploy_manifest(config):
+    steps = config['jobs']['deploy']['steps']
+
+    assert steps[2] == {
+        'restore_cache': {'keys': ['deploy-manifest-{{ .Branch }}-']}
+    }
+    assert steps[3]['run']['name'] == 'deploy'
+    assert steps[4] == {
+        'save_cache': {
+            'key': 'deploy-manifest-{{ .Branch }}-{{ epoch }}',
+            'paths': ['.cache/deploy_manifest.json'],
+        }
+    }